@@ -0,0 +1,234 @@
+import argparse
+import json
+import os
+import time
+from typing import List, Optional, Sequence, Tuple
+
+import numpy as np  # type: ignore
+
+from index_store import MappedStrings, write_strings
+from vector_space import top_k
+
+# Approximate nearest neighbours by cosine similarity: an inverted file (IVF) over a
+# k-means coarse quantizer.
+#
+# Building runs spherical k-means on a sample of the (unit-normalized) vectors to
+# get n_lists centroids, assigns every vector to its nearest centroid, and stores
+# the vectors grouped by list in one contiguous float32 matrix (offsets[l] ..
+# offsets[l + 1] is list l). A query scores the centroids, visits only its n_probes
+# best lists and keeps the top k of their members: n_probes is the recall/latency
+# knob, and n_probes = n_lists is exact search.
+#
+# Vectors must be dense: LsiIndex.doc_embeddings, or a densified TF-IDF matrix when
+# the vocabulary is small (centroids have one float per dimension).
+#
+# Saved indexes are a directory of .npy arrays plus ids.txt(.idx) and meta.json
+# (written last); load() memory-maps the arrays.
+
+
+def _normalize(vectors):
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=1)
+    return vectors / np.where(norms > 0, norms, 1.0)[:, None]
+
+
+def _assign(vectors, centroids, chunk: int = 65536):
+    # Nearest centroid (largest dot product) of every row, chunk rows at a time
+    out = np.empty(len(vectors), dtype=np.int64)
+    for start in range(0, len(vectors), chunk):
+        out[start : start + chunk] = np.argmax(vectors[start : start + chunk] @ centroids.T, axis=1)
+    return out
+
+
+def spherical_kmeans(vectors, n_clusters: int, iters: int = 10, seed: int = 0):
+    """Unit-length centroids (n_clusters x dim) of unit-length rows."""
+    rng = np.random.default_rng(seed)
+    centroids = vectors[rng.choice(len(vectors), n_clusters, replace=False)].copy()
+    for _ in range(iters):
+        assignment = _assign(vectors, centroids)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assignment, vectors)
+        empty = np.bincount(assignment, minlength=n_clusters) == 0
+        # Reseed empty clusters with random points so every list gets used
+        sums[empty] = vectors[rng.choice(len(vectors), int(empty.sum()), replace=False)]
+        centroids = _normalize(sums)
+    return centroids
+
+
+class IVFIndex:
+    def __init__(
+        self,
+        vectors,
+        ids: Optional[Sequence[str]] = None,
+        n_lists: Optional[int] = None,
+        n_probes: int = 8,
+        kmeans_iters: int = 10,
+        train_size: Optional[int] = None,
+        seed: int = 0,
+    ):
+        vectors = _normalize(vectors)
+        num = len(vectors)
+        if num == 0:
+            raise ValueError("Cannot build an IVF index over no vectors")
+        if n_probes < 1:
+            raise ValueError("n_probes must be at least 1")
+        n_lists = min(n_lists or max(1, int(4 * np.sqrt(num))), num)
+        train_size = min(num, train_size or max(64 * n_lists, 10000))
+        rng = np.random.default_rng(seed)
+        sample = vectors[np.sort(rng.choice(num, train_size, replace=False))]
+        self.centroids = spherical_kmeans(sample, n_lists, iters=kmeans_iters, seed=seed)
+        assignment = _assign(vectors, self.centroids)
+        order = np.argsort(assignment, kind="stable")
+        self.vectors = np.ascontiguousarray(vectors[order])  # grouped by list
+        self.rows = order  # position in the input for each stored vector
+        self.offsets = np.zeros(n_lists + 1, dtype=np.int64)
+        np.cumsum(np.bincount(assignment, minlength=n_lists), out=self.offsets[1:])
+        self.ids = list(ids) if ids is not None else [str(i) for i in range(num)]
+        self.n_probes = n_probes
+        self._positions = None
+
+    @property
+    def n_lists(self) -> int:
+        return len(self.centroids)
+
+    def __len__(self) -> int:
+        return len(self.vectors)
+
+    def search(self, queries, k: int = 10, n_probes: Optional[int] = None) -> Tuple["np.ndarray", "np.ndarray"]:
+        """
+        (rows, scores), each (queries x k): input row numbers of the nearest vectors by
+        cosine, best first, padded with -1 / -inf when the probed lists hold fewer than k.
+        """
+        queries = _normalize(np.atleast_2d(queries))
+        n_probes = self.n_probes if n_probes is None else n_probes
+        if n_probes < 1:
+            raise ValueError("n_probes must be at least 1")
+        n_probes = min(n_probes, self.n_lists)
+        rows = np.full((len(queries), k), -1, dtype=np.int64)
+        scores = np.full((len(queries), k), -np.inf, dtype=np.float32)
+        probes, _ = top_k(queries @ self.centroids.T, n_probes)
+        offsets = self.offsets
+        for i, (query, lists) in enumerate(zip(queries, probes)):
+            # Score each probed list in place instead of gathering its vectors
+            candidates = np.concatenate([np.arange(offsets[l], offsets[l + 1]) for l in lists])
+            cand_scores = np.concatenate([self.vectors[offsets[l] : offsets[l + 1]] @ query for l in lists])
+            n = min(k, len(candidates))
+            if n == 0:
+                continue
+            best, best_scores = top_k(cand_scores[None, :], n)
+            rows[i, :n] = self.rows[candidates[best[0]]]
+            scores[i, :n] = best_scores[0]
+        return rows, scores
+
+    def search_ids(self, queries, k: int = 10, n_probes: Optional[int] = None) -> List[List[Tuple[str, float]]]:
+        rows, scores = self.search(queries, k=k, n_probes=n_probes)
+        ids = self.ids
+        return [
+            [(ids[r], float(s)) for r, s in zip(row, score_row) if r >= 0]
+            for row, score_row in zip(rows.tolist(), scores.tolist())
+        ]
+
+    def vector(self, row: int):
+        # Stored (normalized) vector of input row `row`
+        if self._positions is None:
+            self._positions = np.empty(len(self.rows), dtype=np.int64)
+            self._positions[self.rows] = np.arange(len(self.rows))
+        return self.vectors[self._positions[row]]
+
+    def more_like_this(self, row: int, k: int = 10, n_probes: Optional[int] = None) -> List[Tuple[str, float]]:
+        """Nearest neighbours of an indexed vector, excluding itself."""
+        hits = self.search_ids(self.vector(row), k=k + 1, n_probes=n_probes)[0]
+        return [(doc_id, s) for doc_id, s in hits if doc_id != self.ids[row]][:k]
+
+    def save(self, path: str):
+        os.makedirs(path, exist_ok=True)
+        for name in ("centroids", "vectors", "rows", "offsets"):
+            np.save(os.path.join(path, f"{name}.npy"), getattr(self, name))
+        write_strings(os.path.join(path, "ids.txt"), self.ids)
+        with open(os.path.join(path, "meta.json"), "w", encoding="utf-8") as f:
+            json.dump({"n_lists": self.n_lists, "n_probes": self.n_probes, "dim": self.vectors.shape[1]}, f, indent=2)
+
+    @classmethod
+    def load(cls, path: str) -> "IVFIndex":
+        with open(os.path.join(path, "meta.json"), encoding="utf-8") as f:
+            meta = json.load(f)
+        index = cls.__new__(cls)
+        for name in ("centroids", "vectors", "rows", "offsets"):
+            setattr(index, name, np.load(os.path.join(path, f"{name}.npy"), mmap_mode="r"))
+        index.ids = MappedStrings(os.path.join(path, "ids.txt"))
+        index.n_probes = meta["n_probes"]
+        index._positions = None
+        return index
+
+    def close(self):
+        if isinstance(self.ids, MappedStrings):
+            self.ids.close()
+
+
+def exact_search(vectors, queries, k: int = 10, chunk: int = 1024) -> Tuple["np.ndarray", "np.ndarray"]:
+    """Brute-force cosine top-k, the reference for recall_at_k."""
+    vectors = _normalize(vectors)
+    queries = _normalize(np.atleast_2d(queries))
+    k = min(k, len(vectors))
+    rows, scores = [], []
+    for start in range(0, len(queries), chunk):
+        r, s = top_k(queries[start : start + chunk] @ vectors.T, k)
+        rows.append(r)
+        scores.append(s)
+    return np.concatenate(rows), np.concatenate(scores)
+
+
+def recall_at_k(approx_rows, exact_rows) -> float:
+    # Fraction of the exact top k that the approximate search also returned
+    hits = sum(len(set(a.tolist()) & set(e.tolist())) for a, e in zip(approx_rows, exact_rows))
+    return hits / exact_rows.size
+
+
+def benchmark(
+    index: IVFIndex, vectors, queries, k: int = 10, probes: Sequence[int] = (1, 2, 4, 8, 16, 32)
+) -> List[dict]:
+    """Recall@k and latency per n_probes setting against exact search."""
+    exact_rows, _ = exact_search(vectors, queries, k=k)
+    report = []
+    for n_probes in probes:
+        if n_probes > index.n_lists:
+            break
+        start = time.perf_counter()
+        rows, _ = index.search(queries, k=k, n_probes=n_probes)
+        elapsed = time.perf_counter() - start
+        report.append(
+            {
+                "n_probes": n_probes,
+                "recall": recall_at_k(rows, exact_rows),
+                "ms_per_query": 1000 * elapsed / len(queries),
+            }
+        )
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Recall@k / latency benchmark of IVFIndex on synthetic clustered vectors"
+    )
+    parser.add_argument("--vectors", type=int, default=200000, help="Number of indexed vectors")
+    parser.add_argument("--dim", type=int, default=128, help="Vector dimension")
+    parser.add_argument("--queries", type=int, default=200, help="Number of queries")
+    parser.add_argument("--lists", type=int, default=None, help="Number of IVF lists (default 4*sqrt(n))")
+    parser.add_argument("--k", type=int, default=10, help="Neighbours per query")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    centers = rng.standard_normal((256, args.dim)).astype(np.float32)
+    labels = rng.integers(0, len(centers), args.vectors + args.queries)
+    data = centers[labels] + 0.5 * rng.standard_normal((len(labels), args.dim)).astype(np.float32)
+    vectors, queries = data[: args.vectors], data[args.vectors :]
+
+    start = time.perf_counter()
+    index = IVFIndex(vectors, n_lists=args.lists)
+    print(f"built {index.n_lists} lists over {len(index)} vectors in {time.perf_counter() - start:.1f}s")
+    for row in benchmark(index, vectors, queries, k=args.k):
+        print(f"n_probes={row['n_probes']:3d}  recall@{args.k}={row['recall']:.3f}  {row['ms_per_query']:.2f} ms/query")
+
+
+if __name__ == "__main__":
+    main()
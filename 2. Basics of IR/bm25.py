@@ -0,0 +1,117 @@
+import heapq
+import math
+from collections import Counter
+from typing import Iterable, List, Optional, Tuple
+
+from inverted_index import CollectionStats, InvertedIndex
+from postings import NO_MORE_DOCS
+from text_processing import process_text
+
+# Top-k BM25 over InvertedIndex with WAND early termination.
+#
+# Scoring follows Lucene's BM25Similarity (the one search_bm25.py configures):
+#   idf(t)      = ln(1 + (N - df + 0.5) / (df + 0.5))
+#   score(t, d) = idf(t) * tf / (tf + k1 * (1 - b + b * dl / avgdl))
+# Lucene stores dl lossily in a norm byte, so absolute scores differ slightly.
+#
+# Each query term gets an upper bound on its contribution from its largest tf and
+# the shortest document in the index. WAND keeps the cursors sorted by current doc
+# and only fully scores a doc once the bounds of the terms positioned at or before
+# it could beat the current k-th best score; every other cursor is advanced past
+# the gap with skip pointers instead of being scored.
+
+
+class _Term:
+    def __init__(self, cursor, weight: float, upper_bound: float):
+        self.cursor = cursor
+        self.weight = weight
+        self.upper_bound = upper_bound
+
+
+class BM25Searcher:
+    def __init__(
+        self,
+        index: InvertedIndex,
+        k1: float = 1.2,
+        b: float = 0.75,
+        use_lucene: bool = True,
+        stats: Optional[CollectionStats] = None,
+    ):
+        self.index = index
+        self.k1 = k1
+        self.b = b
+        self.use_lucene = use_lucene
+        self.stats = stats if stats is not None else index.stats()
+        self.num_docs = self.stats.num_docs
+        self.avgdl = self.stats.avgdl
+        self.min_dl = self.stats.min_dl
+        self.scored_docs = 0  # docs fully scored by the last search()
+
+    def idf(self, df: int) -> float:
+        return math.log(1.0 + (self.num_docs - df + 0.5) / (df + 0.5))
+
+    def _norm(self, dl: int) -> float:
+        return self.k1 * (1.0 - self.b + self.b * dl / self.avgdl)
+
+    def _query_terms(self, query_terms: Iterable[str]) -> List[_Term]:
+        terms: List[_Term] = []
+        for term, qtf in Counter(query_terms).items():
+            cursor = self.index.cursor(term)
+            if cursor is None:
+                continue
+            weight = qtf * self.idf(self.stats.df(term))
+            max_tf = self.index.term_max_tf(term)
+            bound = weight * max_tf / (max_tf + self._norm(self.min_dl))
+            terms.append(_Term(cursor, weight, bound * (1.0 + 1e-9)))
+        return terms
+
+    def search(self, query: str, k: int = 10, prune: bool = True) -> List[Tuple[str, float]]:
+        return self.search_terms(process_text(query, use_lucene=self.use_lucene), k=k, prune=prune)
+
+    def search_terms(self, query_terms: Iterable[str], k: int = 10, prune: bool = True) -> List[Tuple[str, float]]:
+        # Like search(), for a query that is already analyzed
+        terms = self._query_terms(query_terms)
+        self.scored_docs = 0
+        if not terms or k <= 0:
+            return []
+        for t in terms:
+            t.cursor.next_doc()
+        doc_lengths = self.index.doc_lengths
+        # min-heap of (score, -doc): the root is the current k-th best; ties prefer lower doc numbers
+        top: List[Tuple[float, int]] = []
+        while True:
+            terms.sort(key=lambda t: t.cursor.doc)
+            threshold = top[0][0] if prune and len(top) >= k else -1.0
+            acc = 0.0
+            pivot = -1
+            for i, t in enumerate(terms):
+                if t.cursor.doc == NO_MORE_DOCS:
+                    break
+                acc += t.upper_bound
+                if acc > threshold:
+                    pivot = i
+                    break
+            if pivot < 0:
+                break
+            pivot_doc = terms[pivot].cursor.doc
+            if terms[0].cursor.doc == pivot_doc:
+                norm = self._norm(doc_lengths[pivot_doc])
+                score = 0.0
+                for t in terms:
+                    c = t.cursor
+                    if c.doc != pivot_doc:
+                        break
+                    score += t.weight * c.tf / (c.tf + norm)
+                    c.next_doc()
+                self.scored_docs += 1
+                entry = (score, -pivot_doc)
+                if len(top) < k:
+                    heapq.heappush(top, entry)
+                elif entry > top[0]:
+                    heapq.heapreplace(top, entry)
+            else:
+                # No doc before pivot_doc can make the top k: skip those cursors ahead
+                for t in terms[:pivot]:
+                    t.cursor.advance(pivot_doc)
+        doc_ids = self.index.doc_ids
+        return [(doc_ids[-neg_doc], score) for score, neg_doc in sorted(top, reverse=True)]
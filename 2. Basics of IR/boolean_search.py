@@ -0,0 +1,413 @@
+import bisect
+import heapq
+import re
+from typing import Iterator, List, Optional, Sequence, Tuple
+
+from inverted_index import InvertedIndex
+from postings import NO_MORE_DOCS
+from text_processing import process_text
+
+# Boolean retrieval over InvertedIndex without a JVM.
+#
+# Query syntax: terms, "exact phrases", "sloppy phrases"~k, t1 NEAR/k t2, AND, OR,
+# NOT and parentheses. Adjacent clauses are ANDed, operators bind
+# NEAR > NOT > AND > OR, and every term goes through the same analysis as the
+# indexed text. Wildcard terms (comput*, *ing, c*t*r) are only lowercased and
+# match indexed terms through the index's term dictionary, OR-ed together.
+# Evaluation is document-at-a-time over doc iterators that share the
+# PostingsCursor protocol (doc, next_doc(), advance(target), cost):
+#   - AND leads with its rarest clause and advances the others to its candidate;
+#     advance() gallops over the postings' skip pointers, so selective queries
+#     touch only a few blocks of the long lists
+#   - OR merges its clauses lazily through a heap
+#   - NOT clauses inside an AND are checked only against AND's candidates
+#   - phrases and NEAR intersect at the doc level first and only then merge
+#     positions of the surviving candidates
+
+
+class _AllDocs:
+    def __init__(self, index: InvertedIndex):
+        self.num_docs = index.num_docs
+        self.is_deleted = index.is_deleted if index.has_deletions else None
+        self.cost = self.num_docs
+        self.doc = -1
+
+    def next_doc(self) -> int:
+        return self.advance(self.doc + 1)
+
+    def advance(self, target: int) -> int:
+        if self.doc < target:
+            doc = target
+            if self.is_deleted is not None:
+                while doc < self.num_docs and self.is_deleted(doc):
+                    doc += 1
+            self.doc = doc if doc < self.num_docs else NO_MORE_DOCS
+        return self.doc
+
+
+class _Conjunction:
+    def __init__(self, required: list, excluded: list):
+        self.required = sorted(required, key=lambda it: it.cost)
+        self.excluded = excluded
+        self.cost = self.required[0].cost
+        self.doc = -1
+
+    def _align(self, target: int) -> int:
+        lead = self.required[0]
+        others = self.required[1:]
+        doc = lead.advance(target)
+        while doc != NO_MORE_DOCS:
+            for it in others:
+                d = it.advance(doc)
+                if d > doc:
+                    doc = lead.advance(d)
+                    break
+            else:
+                if any(it.advance(doc) == doc for it in self.excluded):
+                    doc = lead.advance(doc + 1)
+                    continue
+                break
+        self.doc = doc
+        return doc
+
+    def next_doc(self) -> int:
+        return self._align(self.doc + 1)
+
+    def advance(self, target: int) -> int:
+        if self.doc >= target:
+            return self.doc
+        return self._align(target)
+
+
+class _Disjunction:
+    def __init__(self, subs: list):
+        self.subs = subs
+        self.cost = sum(it.cost for it in subs)
+        self.doc = -1
+        self._heap: Optional[List[Tuple[int, int]]] = None
+
+    def next_doc(self) -> int:
+        return self.advance(self.doc + 1)
+
+    def advance(self, target: int) -> int:
+        if self.doc >= target:
+            return self.doc
+        heap = self._heap
+        if heap is None:
+            heap = self._heap = [(it.advance(target), i) for i, it in enumerate(self.subs)]
+            heapq.heapify(heap)
+        else:
+            while heap and heap[0][0] < target:
+                _d, i = heap[0]
+                heapq.heapreplace(heap, (self.subs[i].advance(target), i))
+        self.doc = heap[0][0] if heap else NO_MORE_DOCS
+        return self.doc
+
+
+def _contains(positions: Sequence[int], p: int) -> bool:
+    i = bisect.bisect_left(positions, p)
+    return i < len(positions) and positions[i] == p
+
+
+class _Proximity:
+    """
+    Terms at fixed offsets (a phrase) or at offset 0 (NEAR). A candidate doc matches
+    when, after subtracting each term's offset, all positions fit in a window of
+    width <= slop; slop 0 is an exact phrase. For NEAR, counts[i] > 1 means term i
+    was given that many times and needs that many distinct positions in the window.
+    For a sloppy phrase, groups lists the slots of each term used more than once,
+    and the slots of a group must take distinct positions.
+    """
+
+    def __init__(
+        self,
+        cursors: list,
+        offsets: List[int],
+        slop: int,
+        counts: Optional[List[int]] = None,
+        groups: Optional[List[List[int]]] = None,
+    ):
+        self.cursors = cursors
+        self.offsets = offsets
+        self.slop = slop
+        self.counts = counts if counts is not None and any(n > 1 for n in counts) else None
+        # With slop 0 the offsets already keep the slots of a repeated term apart
+        self.groups = groups if groups and slop > 0 else None
+        self.approximation = _Conjunction(list(cursors), [])
+        self.cost = self.approximation.cost
+        self.doc = -1
+
+    def _confirm(self, doc: int) -> int:
+        while doc != NO_MORE_DOCS and not self._matches():
+            doc = self.approximation.next_doc()
+        self.doc = doc
+        return doc
+
+    def next_doc(self) -> int:
+        return self._confirm(self.approximation.next_doc())
+
+    def advance(self, target: int) -> int:
+        if self.doc >= target:
+            return self.doc
+        return self._confirm(self.approximation.advance(target))
+
+    def _matches(self) -> bool:
+        if self.counts is not None:
+            return self._counted_window_match()
+        if self.groups is not None:
+            return self._distinct_window_match()
+        if self.slop == 0:
+            return self._exact_match()
+        return self._window_match()
+
+    def _exact_match(self) -> bool:
+        # Anchor on the term with the fewest occurrences in this doc and probe the others
+        cursors, offsets = self.cursors, self.offsets
+        anchor = min(range(len(cursors)), key=lambda i: cursors[i].tf)
+        for p in cursors[anchor].doc_positions():
+            start = p - offsets[anchor]
+            for i, c in enumerate(cursors):
+                if i != anchor and not _contains(c.doc_positions(), start + offsets[i]):
+                    break
+            else:
+                return True
+        return False
+
+    def _window_match(self) -> bool:
+        # Sweep all position lists in order, always advancing the smallest one
+        lists = [c.doc_positions() for c in self.cursors]
+        heap = [(lst[0] - off, i, 0) for i, (lst, off) in enumerate(zip(lists, self.offsets))]
+        heapq.heapify(heap)
+        hi = max(v for v, _i, _j in heap)
+        while True:
+            lo, i, j = heap[0]
+            if hi - lo <= self.slop:
+                return True
+            j += 1
+            if j == len(lists[i]):
+                return False
+            v = lists[i][j] - self.offsets[i]
+            if v > hi:
+                hi = v
+            heapq.heapreplace(heap, (v, i, j))
+
+    def _distinct_window_match(self) -> bool:
+        # Try every window start lo (some slot's position minus its offset). Slot i
+        # may take a position in [lo + offsets[i], lo + offsets[i] + slop]; within a
+        # group the windows have equal width, so giving each slot, in offset order,
+        # the first position after the previous slot's finds an assignment if any exists
+        lists = [c.doc_positions() for c in self.cursors]
+        offsets, slop = self.offsets, self.slop
+        grouped = {i for group in self.groups for i in group}
+        units = list(self.groups) + [[i] for i in range(len(lists)) if i not in grouped]
+        for lo in sorted({p - off for lst, off in zip(lists, offsets) for p in lst}):
+            for group in units:
+                last = -1
+                for i in group:
+                    lst = lists[i]
+                    k = bisect.bisect_left(lst, max(lo + offsets[i], last + 1))
+                    if k == len(lst) or lst[k] > lo + offsets[i] + slop:
+                        break
+                    last = lst[k]
+                else:
+                    continue
+                break
+            else:
+                return True
+        return False
+
+    def _counted_window_match(self) -> bool:
+        # Two-pointer sweep over all (position, term) pairs in order: shrink the window
+        # from the left while it still holds counts[i] positions of every term i
+        events = sorted((p, i) for i, c in enumerate(self.cursors) for p in c.doc_positions())
+        counts = self.counts
+        have = [0] * len(counts)
+        satisfied = 0
+        left = 0
+        for right_pos, i in events:
+            have[i] += 1
+            if have[i] == counts[i]:
+                satisfied += 1
+            while satisfied == len(counts):
+                left_pos, j = events[left]
+                if right_pos - left_pos <= self.slop:
+                    return True
+                if have[j] == counts[j]:
+                    satisfied -= 1
+                have[j] -= 1
+                left += 1
+        return False
+
+
+class _Empty:
+    cost = 0
+    doc = NO_MORE_DOCS
+
+    def next_doc(self) -> int:
+        return NO_MORE_DOCS
+
+    def advance(self, target: int) -> int:
+        return NO_MORE_DOCS
+
+
+_LEX_RE = re.compile(r'"[^"]*"(?:~\d+)?|\(|\)|[^\s()"]+')
+_PHRASE_RE = re.compile(r'"([^"]*)"(?:~(\d+))?')
+_NEAR_RE = re.compile(r"NEAR/(\d+)")
+_OPERATORS = {"AND", "OR", "NOT"}
+
+
+class BooleanSearcher:
+    def __init__(self, index: InvertedIndex, use_lucene: bool = True):
+        self.index = index
+        self.use_lucene = use_lucene
+
+    # Parsing produces a small AST of tuples: ("term", t), ("and", [..]), ("or", [..]),
+    # ("not", node), ("phrase", [terms], slop), ("near", [terms], k),
+    # ("wildcard", pattern). Terms that analyze to nothing (stopwords) are dropped
+    # as None.
+
+    def parse(self, query: str):
+        self._tokens = _LEX_RE.findall(query)
+        self._i = 0
+        node = self._parse_or()
+        if self._i != len(self._tokens):
+            raise ValueError(f"Unexpected {self._tokens[self._i]!r} in query: {query!r}")
+        return node
+
+    def _peek(self) -> Optional[str]:
+        return self._tokens[self._i] if self._i < len(self._tokens) else None
+
+    def _parse_or(self):
+        clauses = [self._parse_and()]
+        while self._peek() == "OR":
+            self._i += 1
+            clauses.append(self._parse_and())
+        return self._combine("or", clauses)
+
+    def _parse_and(self):
+        clauses = [self._parse_not()]
+        while self._peek() not in (None, ")", "OR"):
+            if self._peek() == "AND":
+                self._i += 1
+            clauses.append(self._parse_not())
+        return self._combine("and", clauses)
+
+    def _parse_not(self):
+        if self._peek() == "NOT":
+            self._i += 1
+            child = self._parse_not()
+            return ("not", child) if child is not None else None
+        return self._parse_near()
+
+    def _parse_near(self):
+        node = self._parse_atom()
+        clauses = [node]
+        window = None
+        while self._peek() is not None and _NEAR_RE.fullmatch(self._peek()):
+            k = int(_NEAR_RE.fullmatch(self._peek()).group(1))
+            if window is not None and k != window:
+                raise ValueError("A chain of NEAR operators must use a single distance")
+            window = k
+            self._i += 1
+            clauses.append(self._parse_atom())
+        if window is None:
+            return node
+        terms = [c for c in clauses if c is not None]
+        if any(c[0] != "term" for c in terms):
+            raise ValueError("NEAR/k only joins single terms")
+        if len(terms) < 2:
+            return terms[0] if terms else None
+        return ("near", [c[1] for c in terms], window)
+
+    def _parse_atom(self):
+        tok = self._peek()
+        if tok is None or tok == ")" or tok in _OPERATORS or _NEAR_RE.fullmatch(tok):
+            raise ValueError(f"Expected a term or '(' but found {tok!r}")
+        self._i += 1
+        if tok == "(":
+            node = self._parse_or()
+            if self._peek() != ")":
+                raise ValueError("Unbalanced parentheses in query")
+            self._i += 1
+            return node
+        phrase = _PHRASE_RE.fullmatch(tok)
+        if phrase:
+            terms = self.analyze(phrase.group(1))
+            if len(terms) <= 1:
+                return ("term", terms[0]) if terms else None
+            return ("phrase", terms, int(phrase.group(2) or 0))
+        if "*" in tok:
+            return ("wildcard", tok.lower())
+        return self._combine("and", [("term", t) for t in self.analyze(tok)])
+
+    def analyze(self, text: str) -> List[str]:
+        return process_text(text, use_lucene=self.use_lucene)
+
+    @staticmethod
+    def _combine(op: str, clauses: list):
+        flat = []
+        for c in clauses:
+            if c is None:
+                continue
+            if c[0] == op:
+                flat.extend(c[1])
+            else:
+                flat.append(c)
+        if not flat:
+            return None
+        return flat[0] if len(flat) == 1 else (op, flat)
+
+    def _iterator(self, node):
+        kind = node[0]
+        if kind == "term":
+            cursor = self.index.cursor(node[1])
+            return cursor if cursor is not None else _Empty()
+        if kind == "and":
+            required = [self._iterator(c) for c in node[1] if c[0] != "not"]
+            excluded = [self._iterator(c[1]) for c in node[1] if c[0] == "not"]
+            if not required:
+                required = [_AllDocs(self.index)]
+            return _Conjunction(required, excluded)
+        if kind == "or":
+            return _Disjunction([self._iterator(c) for c in node[1]])
+        if kind == "wildcard":
+            cursors = [self.index.cursor(t) for t in self.index.expand_terms(node[1])]
+            return _Disjunction(cursors) if cursors else _Empty()
+        if kind == "not":
+            return _Conjunction([_AllDocs(self.index)], [self._iterator(node[1])])
+        if kind in ("phrase", "near"):
+            terms, slop = node[1], node[2]
+            if kind == "near":
+                # A repeated term is one cursor that must match at distinct positions
+                counts = [terms.count(t) for t in dict.fromkeys(terms)]
+                terms = list(dict.fromkeys(terms))
+            cursors = [self.index.cursor(t) for t in terms]
+            if any(c is None for c in cursors):
+                return _Empty()
+            if kind == "phrase":
+                slots = {}
+                for i, t in enumerate(terms):
+                    slots.setdefault(t, []).append(i)
+                groups = [group for group in slots.values() if len(group) > 1]
+                return _Proximity(cursors, list(range(len(terms))), slop, groups=groups)
+            return _Proximity(cursors, [0] * len(terms), slop, counts)
+        raise ValueError(f"Unknown query node: {kind}")
+
+    def doc_numbers(self, query: str) -> Iterator[int]:
+        node = self.parse(query)
+        if node is None:
+            return
+        it = self._iterator(node)
+        doc = it.next_doc()
+        while doc != NO_MORE_DOCS:
+            yield doc
+            doc = it.next_doc()
+
+    def search(self, query: str, limit: Optional[int] = None) -> List[str]:
+        doc_ids = self.index.doc_ids
+        result: List[str] = []
+        for doc in self.doc_numbers(query):
+            if limit is not None and len(result) >= limit:
+                break
+            result.append(doc_ids[doc])
+        return result
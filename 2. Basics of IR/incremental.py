@@ -0,0 +1,158 @@
+import math
+import zlib
+from array import array
+from typing import Dict, Iterable, List, Optional, Union
+
+from matrix import require_numpy, csr_matrix
+from representation import Document, analyze_documents
+from text_processing import process_text
+
+try:
+    import numpy as np  # type: ignore
+except ImportError:
+    pass  # only transform() needs it
+
+# Incremental vocabulary and TF-IDF model for a growing corpus.
+#
+# partial_fit() only touches the terms of the new documents: a term gets the next
+# free feature ID the first time it is seen and keeps it for good, and its document
+# frequency is bumped once per document. Nothing is recomputed per document: idf is
+# evaluated per term at vectorization time (O(doc length)), and the full idf array
+# is rebuilt only when idf() is asked for after the model changed.
+#
+# min_df/max_df prune terms at vectorization time without renumbering anything, so
+# vectors stay comparable as the corpus grows. With n_features set the model uses
+# feature hashing instead of a term dictionary: a term's feature is crc32(term) mod
+# n_features, memory is bounded by n_features, and colliding terms share a df.
+#
+# Weights follow tf_idf_matrix: tf is count / doc length (or 1 + ln(count) with
+# sublinear_tf), idf = ln((N + 1) / (df + 1)) + 1, then optional L2 normalization.
+
+
+class IncrementalTfidf:
+    def __init__(
+        self,
+        use_lucene: bool = True,
+        min_df: int = 1,
+        max_df: Union[int, float] = 1.0,
+        n_features: Optional[int] = None,
+        sublinear_tf: bool = False,
+        norm: Optional[str] = "l2",
+    ):
+        if norm not in (None, "l2"):
+            raise ValueError(f"Unsupported norm: {norm!r}")
+        if isinstance(max_df, float) and not 0.0 < max_df <= 1.0:
+            raise ValueError("A float max_df is a fraction of the documents and must be in (0, 1]")
+        if n_features is not None and n_features <= 0:
+            raise ValueError("n_features must be positive")
+        self.use_lucene = use_lucene
+        self.min_df = min_df
+        self.max_df = max_df
+        self.n_features = n_features
+        self.sublinear_tf = sublinear_tf
+        self.norm = norm
+        self.num_docs = 0
+        self.term_to_id: Dict[str, int] = {}  # stays empty in hashing mode
+        self.id_to_term: List[str] = []
+        self.doc_freqs = array("I", [0]) * n_features if n_features else array("I")
+        self._idf: Optional[array] = None  # cached idf(); dropped whenever the model changes
+
+    @property
+    def hashing(self) -> bool:
+        return self.n_features is not None
+
+    @property
+    def num_features(self) -> int:
+        return self.n_features if self.hashing else len(self.id_to_term)
+
+    def _feature(self, term: str, add: bool = False) -> int:
+        # Feature ID of `term`, -1 if unknown (assigned when `add` is set)
+        if self.hashing:
+            return zlib.crc32(term.encode("utf-8")) % self.n_features
+        feature = self.term_to_id.get(term, -1)
+        if feature < 0 and add:
+            feature = len(self.id_to_term)
+            self.term_to_id[term] = feature
+            self.id_to_term.append(term)
+            self.doc_freqs.append(0)
+        return feature
+
+    def partial_fit_tokens(self, tokens: Iterable[str]):
+        doc_freqs = self.doc_freqs
+        for feature in {self._feature(t, add=True) for t in tokens}:
+            doc_freqs[feature] += 1
+        self.num_docs += 1
+        self._idf = None
+
+    def partial_fit(self, documents: Iterable[Document], workers: int = 1) -> "IncrementalTfidf":
+        for _doc, tokens in analyze_documents(documents, use_lucene=self.use_lucene, workers=workers):
+            self.partial_fit_tokens(tokens)
+        return self
+
+    def _max_df_count(self) -> float:
+        if isinstance(self.max_df, float):
+            return self.max_df * self.num_docs
+        return self.max_df
+
+    def is_active(self, feature: int) -> bool:
+        df = self.doc_freqs[feature]
+        return df >= max(self.min_df, 1) and df <= self._max_df_count()
+
+    def _idf_of(self, df: int) -> float:
+        return math.log((self.num_docs + 1) / (df + 1)) + 1.0
+
+    def idf(self) -> array:
+        """idf per feature ID; pruned features get 0."""
+        if self._idf is None:
+            idf = array("d", bytes(8 * self.num_features))
+            for feature, df in enumerate(self.doc_freqs):
+                if self.is_active(feature):
+                    idf[feature] = self._idf_of(df)
+            self._idf = idf
+        return self._idf
+
+    def vocabulary(self) -> Dict[str, int]:
+        """Active terms and their stable feature IDs."""
+        if self.hashing:
+            raise ValueError("A hashing model keeps no vocabulary")
+        return {t: i for i, t in enumerate(self.id_to_term) if self.is_active(i)}
+
+    def vectorize_tokens(self, tokens: List[str]) -> Dict[int, float]:
+        counts: Dict[int, int] = {}
+        for t in tokens:
+            feature = self._feature(t)
+            if feature >= 0:
+                counts[feature] = counts.get(feature, 0) + 1
+        length = len(tokens) or 1
+        vector: Dict[int, float] = {}
+        for feature, c in counts.items():
+            if self.is_active(feature):
+                tf = 1.0 + math.log(c) if self.sublinear_tf else c / length
+                vector[feature] = tf * self._idf_of(self.doc_freqs[feature])
+        if self.norm == "l2" and vector:
+            l2 = math.sqrt(sum(w * w for w in vector.values()))
+            vector = {f: w / l2 for f, w in vector.items()}
+        return vector
+
+    def vectorize(self, doc: Document) -> Dict[int, float]:
+        return self.vectorize_tokens(process_text(doc.text, use_lucene=self.use_lucene))
+
+    def transform(self, documents: Iterable[Document], workers: int = 1):
+        """CSR matrix of the documents' vectors (rows) over num_features columns; the model is not updated."""
+        require_numpy()
+        data = array("d")
+        indices = array("q")
+        indptr = array("q", [0])
+        for _doc, tokens in analyze_documents(documents, use_lucene=self.use_lucene, workers=workers):
+            vector = self.vectorize_tokens(tokens)
+            for feature in sorted(vector):
+                indices.append(feature)
+                data.append(vector[feature])
+            indptr.append(len(indices))
+        # np.array copies: views from np.frombuffer would be read-only
+        return csr_matrix(
+            np.array(data, dtype=np.float64),
+            np.array(indices, dtype=np.int64),
+            np.array(indptr, dtype=np.int64),
+            (len(indptr) - 1, self.num_features),
+        )
@@ -0,0 +1,137 @@
+import bisect
+import json
+import mmap
+import os
+import sys
+from array import array
+from typing import Iterable, Iterator, List
+
+# On-disk layout helpers for InvertedIndex.save()/open(). Every file is either raw
+# bytes or a native-endian array, so readers mmap it and slice or cast it in place
+# instead of parsing; several processes opening the same index share the page cache.
+
+FORMAT_VERSION = 5
+
+
+class MappedFile:
+    def __init__(self, path: str):
+        self.path = path
+        self._mmap = None
+        with open(path, "rb") as f:
+            if os.fstat(f.fileno()).st_size > 0:
+                self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self._views: List[memoryview] = []
+
+    def view(self, fmt: str = "B") -> memoryview:
+        view = memoryview(self._mmap if self._mmap is not None else b"")
+        if fmt != "B":
+            view = view.cast(fmt)
+        self._views.append(view)
+        return view
+
+    def close(self):
+        for view in self._views:
+            view.release()
+        self._views = []
+        if self._mmap is not None:
+            try:
+                self._mmap.close()
+            except BufferError:
+                # Slices handed out by a view (e.g. a cursor's postings) still pin the
+                # map; dropping our reference lets the GC unmap it once they are gone
+                pass
+            self._mmap = None
+
+
+def write_array(path: str, values: array):
+    with open(path, "wb") as f:
+        values.tofile(f)
+
+
+class StringsWriter:
+    """
+    Streams strings to `path` as UTF-8 payloads back to back, plus `<path>.idx`
+    holding len+1 byte offsets as array('Q'). Memory use does not grow with count.
+    """
+
+    def __init__(self, path: str):
+        self._data = open(path, "wb")
+        self._index = open(path + ".idx", "wb")
+        self._offset = 0
+        self.count = 0
+        array("Q", [0]).tofile(self._index)
+
+    def write(self, s: str):
+        data = s.encode("utf-8")
+        self._data.write(data)
+        self._offset += len(data)
+        self.count += 1
+        array("Q", [self._offset]).tofile(self._index)
+
+    def close(self):
+        self._data.close()
+        self._index.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def write_strings(path: str, strings: Iterable[str]):
+    with StringsWriter(path) as w:
+        for s in strings:
+            w.write(s)
+
+
+class MappedStrings:
+    """Read-only sequence of strings written by write_strings(), decoded on access."""
+
+    def __init__(self, path: str):
+        self._data_file = MappedFile(path)
+        self._offsets_file = MappedFile(path + ".idx")
+        self._data = self._data_file.view()
+        self._offsets = self._offsets_file.view("Q")
+
+    def __len__(self) -> int:
+        return max(len(self._offsets) - 1, 0)
+
+    def __getitem__(self, i: int) -> str:
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError(i)
+        return bytes(self._data[self._offsets[i] : self._offsets[i + 1]]).decode("utf-8")
+
+    def __iter__(self) -> Iterator[str]:
+        for i in range(len(self)):
+            yield self[i]
+
+    def find(self, s: str) -> int:
+        # Binary search; only valid when the strings were written in sorted order
+        i = bisect.bisect_left(self, s)
+        if i < len(self) and self[i] == s:
+            return i
+        return -1
+
+    def close(self):
+        self._data_file.close()
+        self._offsets_file.close()
+
+
+def write_meta(path: str, **fields):
+    meta = {"format_version": FORMAT_VERSION, "byteorder": sys.byteorder}
+    meta.update(fields)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(meta, f, indent=2)
+
+
+def read_meta(path: str) -> dict:
+    with open(path, encoding="utf-8") as f:
+        meta = json.load(f)
+    if meta.get("format_version") != FORMAT_VERSION:
+        raise ValueError(f"Unsupported index format: {meta.get('format_version')}")
+    if meta.get("byteorder") != sys.byteorder:
+        raise ValueError(f"Index was written on a {meta.get('byteorder')}-endian machine")
+    return meta
@@ -1,32 +1,366 @@
-from typing import Dict, List, Tuple, Iterable
+import os
+from array import array
+from typing import Callable, Dict, List, NamedTuple, Optional, Sequence, Tuple, Iterable, Iterator
 
-from representation import Document
+from index_store import MappedFile, MappedStrings, StringsWriter, read_meta, write_meta
+from postings import SKIP_INTERVAL, PostingsCursor, decode_doc_postings, decode_postings, encode_posting
+from representation import AnalyzedCorpus, Document, analyze_documents
+from term_dict import PermutermIndex, TermDictionary, TermDictWriter
 from text_processing import process_text
 
 
 Posting = Tuple[str, List[int]]  # (doc_id, positions)
 
 
+class TermEntry(NamedTuple):
+    df: int
+    max_tf: int  # largest tf in the list; bounds the term's score contribution
+    cf: int  # collection frequency: sum of tf over the list
+    docs: bytes  # encoded doc gaps/tfs
+    positions: bytes  # encoded position gaps
+    skips: Sequence[int]  # skip triples
+
+
+class CollectionStats:
+    """
+    Collection-level statistics for scoring, all read in O(1): N, total tokens,
+    avgdl, the shortest document length, and per-term df and cf lookups. An index's
+    stats() describe that index; a sharded searcher builds one from collection-wide
+    values so that every shard scores on the same scale.
+    """
+
+    def __init__(
+        self,
+        num_docs: int,
+        total_tokens: int,
+        min_dl: int,
+        df: Callable[[str], int],
+        cf: Callable[[str], int],
+    ):
+        self.num_docs = num_docs
+        self.total_tokens = total_tokens
+        self.avgdl = total_tokens / num_docs if num_docs else 0.0
+        self.min_dl = min_dl
+        self.df = df
+        self.cf = cf
+
+
 class InvertedIndex:
+    """
+    Positional inverted index with compact postings. Documents get dense integer
+    numbers in insertion order (doc_ids maps them back to external IDs), and each
+    term's postings are delta-gap + vbyte encoded into bytearrays (see postings.py).
+    Collection statistics (total tokens, shortest doc, per-term df/cf) are kept up
+    to date as documents are added, so stats() never scans.
+    """
+
     def __init__(self):
-        self.index: Dict[str, List[Posting]] = {}
+        self.doc_ids: List[str] = []  # doc number -> external doc_id
+        self.doc_lengths = array("I")  # doc number -> token count
+        self.total_tokens = 0
+        self.min_doc_length = 0
+        self.term_ids: Dict[str, int] = {}  # term -> term number
+        self.terms: List[str] = []
+        self.doc_freq = array("I")  # per term number
+        self.max_tf = array("I")  # per term number
+        self.coll_freq = array("Q")  # per term number
+        self._docs: List[bytearray] = []
+        self._positions: List[bytearray] = []
+        self._skips: List[Optional[array]] = []  # created once a list outgrows one block
+        self._last_doc = array("I")  # per term number, base for the next doc gap
+        # Sorted copy of term_ids for range and wildcard lookups, rebuilt after new
+        # terms; only opened indexes keep the front-coded dictionary alone
+        self._dictionary: Optional[TermDictionary] = None
+        self._permuterm: Optional[PermutermIndex] = None
 
     def add_document(self, doc: Document, use_lucene: bool = True):
-        tokens = process_text(doc.text, use_lucene=use_lucene)
+        self.add_tokens(doc.doc_id, process_text(doc.text, use_lucene=use_lucene))
+
+    def add_tokens(self, doc_id: str, tokens: List[str]):
+        doc_num = self._add_doc(doc_id, len(tokens))
         positions: Dict[str, List[int]] = {}
         for pos, token in enumerate(tokens):
             positions.setdefault(token, []).append(pos)
         for term, pos_list in positions.items():
-            self.index.setdefault(term, []).append((doc.doc_id, pos_list))
+            self._add_posting(term, doc_num, pos_list)
+
+    def _add_doc(self, doc_id: str, length: int) -> int:
+        if not self.doc_ids or length < self.min_doc_length:
+            self.min_doc_length = length
+        self.doc_ids.append(doc_id)
+        self.doc_lengths.append(length)
+        self.total_tokens += length
+        return len(self.doc_ids) - 1
+
+    def _add_posting(self, term: str, doc_num: int, pos_list: List[int]):
+        # doc_num must be larger than any doc already in this term's list
+        term_id = self._term_id(term)
+        docs, term_positions = self._docs[term_id], self._positions[term_id]
+        df = self.doc_freq[term_id]
+        if df and df % SKIP_INTERVAL == 0:
+            if self._skips[term_id] is None:
+                self._skips[term_id] = array("Q")
+            self._skips[term_id].extend((self._last_doc[term_id], len(docs), len(term_positions)))
+        encode_posting(docs, term_positions, doc_num - self._last_doc[term_id], pos_list)
+        self._last_doc[term_id] = doc_num
+        self.doc_freq[term_id] += 1
+        self.coll_freq[term_id] += len(pos_list)
+        if len(pos_list) > self.max_tf[term_id]:
+            self.max_tf[term_id] = len(pos_list)
+
+    def _term_id(self, term: str) -> int:
+        term_id = self.term_ids.get(term)
+        if term_id is None:
+            term_id = len(self.terms)
+            self.term_ids[term] = term_id
+            self.terms.append(term)
+            self._docs.append(bytearray())
+            self._positions.append(bytearray())
+            self._skips.append(None)
+            self._last_doc.append(0)
+            self.doc_freq.append(0)
+            self.max_tf.append(0)
+            self.coll_freq.append(0)
+        return term_id
+
+    def build(self, documents: Iterable[Document], use_lucene: bool = True, workers: int = 1):
+        if isinstance(documents, AnalyzedCorpus):
+            # Reuse the cached token streams instead of analyzing again
+            for doc_id, tokens in documents.iter_tokens():
+                self.add_tokens(doc_id, tokens)
+            return
+        # Analysis may run in a process pool; postings are merged here in document order
+        for doc, tokens in analyze_documents(documents, use_lucene=use_lucene, workers=workers):
+            self.add_tokens(doc.doc_id, tokens)
+
+    @property
+    def num_docs(self) -> int:
+        return len(self.doc_ids)
+
+    # A plain index never deletes; IndexSnapshot (segments.py) overrides these
+    has_deletions = False
+
+    def is_deleted(self, doc: int) -> bool:
+        return False
+
+    def _term_entry(self, term: str) -> Optional[TermEntry]:
+        term_id = self.term_ids.get(term)
+        if term_id is None:
+            return None
+        skips = self._skips[term_id]
+        return TermEntry(
+            self.doc_freq[term_id],
+            self.max_tf[term_id],
+            self.coll_freq[term_id],
+            self._docs[term_id],
+            self._positions[term_id],
+            skips if skips is not None else (),
+        )
+
+    def df(self, term: str) -> int:
+        entry = self._term_entry(term)
+        return entry.df if entry is not None else 0
+
+    def cf(self, term: str) -> int:
+        entry = self._term_entry(term)
+        return entry.cf if entry is not None else 0
+
+    def term_max_tf(self, term: str) -> int:
+        entry = self._term_entry(term)
+        return entry.max_tf if entry is not None else 0
 
-    def build(self, documents: Iterable[Document], use_lucene: bool = True):
-        for doc in documents:
-            self.add_document(doc, use_lucene=use_lucene)
+    def stats(self) -> CollectionStats:
+        return CollectionStats(self.num_docs, self.total_tokens, self.min_doc_length, self.df, self.cf)
+
+    def doc_postings(self, term: str) -> Iterator[Tuple[int, int]]:
+        # (doc number, tf) without decoding positions
+        entry = self._term_entry(term)
+        if entry is None:
+            return iter(())
+        return decode_doc_postings(entry.docs)
+
+    def positional_postings(self, term: str) -> Iterator[Tuple[int, List[int]]]:
+        entry = self._term_entry(term)
+        if entry is None:
+            return iter(())
+        return decode_postings(entry.docs, entry.positions)
+
+    def cursor(self, term: str) -> Optional[PostingsCursor]:
+        entry = self._term_entry(term)
+        if entry is None:
+            return None
+        return PostingsCursor(entry.docs, entry.positions, entry.skips, entry.df)
 
     def postings(self, term: str) -> List[Posting]:
-        return self.index.get(term, [])
+        # Decoded (doc_id, positions) list, as before postings were compressed;
+        # positional_postings() is the lazy, doc-number level variant
+        doc_ids = self.doc_ids
+        return [(doc_ids[doc], pos) for doc, pos in self.positional_postings(term)]
+
+    @property
+    def index(self) -> Dict[str, List[Posting]]:
+        # Compatibility view of the former term -> postings dict. It decodes every
+        # list, and changes to it do not reach the index.
+        return {term: self.postings(term) for term in self.vocabulary()}
+
+    def term_dictionary(self) -> TermDictionary:
+        if self._dictionary is None or len(self._dictionary) != len(self.terms):
+            self._dictionary = TermDictionary.from_sorted(sorted(self.term_ids))
+            self._permuterm = None
+        return self._dictionary
 
     def vocabulary(self) -> List[str]:
-        return sorted(self.index.keys())
+        return list(self.term_dictionary())
+
+    def expand_terms(self, pattern: str) -> List[str]:
+        # Sorted terms matching a pattern where '*' stands for any run of characters
+        if "*" not in pattern:
+            return [pattern] if self.df(pattern) else []
+        terms = self.term_dictionary()
+        head, _, rest = pattern.partition("*")
+        if rest == "":
+            return list(terms.with_prefix(head))
+        if self._permuterm is None:
+            self._permuterm = PermutermIndex(terms)
+        return self._permuterm.lookup(pattern)
+
+    def save(self, path: str):
+        entries = ((term, self._term_entry(term)) for term in self.term_dictionary())
+        write_index(path, entries, self.doc_ids, self.doc_lengths)
+
+    @classmethod
+    def open(cls, path: str) -> "MappedInvertedIndex":
+        return MappedInvertedIndex(path)
+
+
+def write_index(
+    path: str, entries: Iterable[Tuple[str, TermEntry]], doc_ids: Iterable[str], doc_lengths: Iterable[int]
+):
+    """
+    Write an index to directory `path`, streaming every input once:
+      terms.dict(.idx) front-coded sorted term dictionary (`entries` must come
+                       in term order), see term_dict.py
+      terms.ptr        per term: df, max tf, cf, docs offset/length,
+                       positions offset/length, skips offset/count
+      postings.bin     encoded postings, one term after another
+      skips.bin        array('Q') skip triples for long postings lists
+      doclens.bin      array('I') of document lengths
+      docids.txt(.idx) doc number -> external doc_id
+      meta.json        counts plus total tokens and the shortest doc length
+    """
+    os.makedirs(path, exist_ok=True)
+    offset = 0
+    num_skips = 0
+    with open(os.path.join(path, "postings.bin"), "wb") as postings_out, open(
+        os.path.join(path, "skips.bin"), "wb"
+    ) as skips_out, open(os.path.join(path, "terms.ptr"), "wb") as ptrs_out, TermDictWriter(
+        os.path.join(path, "terms.dict")
+    ) as terms_out:
+        for term, entry in entries:
+            docs, positions = entry.docs, entry.positions
+            postings_out.write(docs)
+            postings_out.write(positions)
+            array("Q", (entry.df, entry.max_tf, entry.cf)).tofile(ptrs_out)
+            array("Q", (offset, len(docs), offset + len(docs), len(positions))).tofile(ptrs_out)
+            array("Q", (num_skips, len(entry.skips))).tofile(ptrs_out)
+            array("Q", entry.skips).tofile(skips_out)
+            terms_out.write(term)
+            num_skips += len(entry.skips)
+            offset += len(docs) + len(positions)
+        num_terms = terms_out.count
+    with StringsWriter(os.path.join(path, "docids.txt")) as docids_out:
+        for doc_id in doc_ids:
+            docids_out.write(doc_id)
+        num_docs = docids_out.count
+    total_tokens = 0
+    min_doc_length = None
+    with open(os.path.join(path, "doclens.bin"), "wb") as f:
+        chunk = array("I")
+        for length in doc_lengths:
+            chunk.append(length)
+            total_tokens += length
+            if min_doc_length is None or length < min_doc_length:
+                min_doc_length = length
+            if len(chunk) >= 65536:
+                chunk.tofile(f)
+                chunk = array("I")
+        chunk.tofile(f)
+    # meta.json goes last: its presence marks a complete index
+    write_meta(
+        os.path.join(path, "meta.json"),
+        num_docs=num_docs,
+        num_terms=num_terms,
+        total_tokens=total_tokens,
+        min_doc_length=min_doc_length or 0,
+    )
+
+
+class MappedInvertedIndex(InvertedIndex):
+    """
+    Read-only index opened from a directory written by InvertedIndex.save(). Nothing
+    is decoded up front: term lookup is a binary search over the mmapped front-coded
+    dictionary
+    and a term's postings are sliced out of postings.bin only when queried.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.meta = read_meta(os.path.join(path, "meta.json"))
+        self._dictionary = TermDictionary.open(os.path.join(path, "terms.dict"))
+        self._permuterm = None
+        self._ptrs_file = MappedFile(os.path.join(path, "terms.ptr"))
+        self._postings_file = MappedFile(os.path.join(path, "postings.bin"))
+        self._skips_file = MappedFile(os.path.join(path, "skips.bin"))
+        self._doclens_file = MappedFile(os.path.join(path, "doclens.bin"))
+        self._ptrs = self._ptrs_file.view("Q")
+        self._postings = self._postings_file.view()
+        self._skips = self._skips_file.view("Q")
+        self.doc_lengths = self._doclens_file.view("I")
+        self.total_tokens = self.meta["total_tokens"]
+        self.min_doc_length = self.meta["min_doc_length"]
+        self.doc_ids = MappedStrings(os.path.join(path, "docids.txt"))
+
+    def add_tokens(self, doc_id: str, tokens: List[str]):
+        raise TypeError("An opened index is read-only; build a new InvertedIndex and save() it")
+
+    def _term_entry(self, term: str) -> Optional[TermEntry]:
+        i = self._dictionary.find(term)
+        if i < 0:
+            return None
+        df, max_tf, cf, docs_off, docs_len, pos_off, pos_len, skip_off, skip_len = self._ptrs[9 * i : 9 * i + 9]
+        postings = self._postings
+        return TermEntry(
+            df,
+            max_tf,
+            cf,
+            postings[docs_off : docs_off + docs_len],
+            postings[pos_off : pos_off + pos_len],
+            self._skips[skip_off : skip_off + skip_len],
+        )
+
+    def term_dictionary(self) -> TermDictionary:
+        return self._dictionary
+
+    def close(self):
+        # Close every file even if one fails, then re-raise the first error
+        error = None
+        for f in (
+            self._dictionary,
+            self.doc_ids,
+            self._ptrs_file,
+            self._postings_file,
+            self._skips_file,
+            self._doclens_file,
+        ):
+            try:
+                f.close()
+            except Exception as e:
+                error = error or e
+        if error is not None:
+            raise error
 
+    def __enter__(self):
+        return self
 
+    def __exit__(self, *exc):
+        self.close()
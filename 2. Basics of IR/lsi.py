@@ -0,0 +1,121 @@
+from typing import List, Sequence, Tuple, Union
+
+import numpy as np  # type: ignore
+
+from matrix import row_slice, transpose_matmul
+from representation import AnalyzedCorpus, Corpus
+from vector_space import VectorSpaceSearcher, top_k
+
+# Latent semantic indexing over the TF-IDF matrix.
+#
+# randomized_svd() computes a rank-k truncated SVD A ~ U S Vt of the sparse
+# (docs x terms) matrix with the randomized range finder of Halko, Martinsson and
+# Tropp: project A onto k + oversample random directions, refine the basis with a
+# few power iterations (each an orthonormalized pass over A and A.T), then take an
+# exact SVD of the small projected matrix. Every product with A streams over blocks
+# of chunk_rows documents, so the only dense temporaries are (chunk x (k + p)) and
+# the (docs or terms) x (k + p) bases.
+#
+# Documents are embedded as rows of A V (which U S approximates), stored as one
+# contiguous float32 matrix. A query folds into the same space as q V, so a document
+# folded in as a query lands on its stored embedding; search is cosine over
+# embeddings.
+
+
+def _times(matrix, right, chunk_rows: int, dtype=np.float64):
+    # A @ right, one block of rows at a time
+    out = np.empty((matrix.shape[0], right.shape[1]), dtype=dtype)
+    for start in range(0, matrix.shape[0], chunk_rows):
+        stop = min(start + chunk_rows, matrix.shape[0])
+        out[start:stop] = row_slice(matrix, start, stop) @ right
+    return out
+
+
+def _transpose_times(matrix, left, chunk_rows: int):
+    # A.T @ left, accumulated over the same blocks
+    out = np.zeros((matrix.shape[1], left.shape[1]))
+    for start in range(0, matrix.shape[0], chunk_rows):
+        stop = min(start + chunk_rows, matrix.shape[0])
+        out += transpose_matmul(row_slice(matrix, start, stop), left[start:stop])
+    return out
+
+
+def randomized_svd(
+    matrix, rank: int, oversample: int = 10, power_iters: int = 2, chunk_rows: int = 4096, seed: int = 0
+) -> Tuple["np.ndarray", "np.ndarray", "np.ndarray"]:
+    """Returns (U, s, Vt) with U (docs x rank), s (rank,), Vt (rank x terms)."""
+    num_rows, num_cols = matrix.shape
+    width = min(rank + oversample, num_rows, num_cols)
+    rank = min(rank, width)
+
+    def times(right):
+        return _times(matrix, right, chunk_rows)
+
+    def transpose_times(left):
+        return _transpose_times(matrix, left, chunk_rows)
+
+    rng = np.random.default_rng(seed)
+    basis, _ = np.linalg.qr(times(rng.standard_normal((num_cols, width))))
+    for _ in range(power_iters):
+        # Re-orthonormalizing after each product keeps small singular directions from vanishing
+        basis_t, _ = np.linalg.qr(transpose_times(basis))
+        basis, _ = np.linalg.qr(times(basis_t))
+    # B = basis.T @ A is (width x terms); its SVD is cheap
+    small_u, s, vt = np.linalg.svd(transpose_times(basis).T, full_matrices=False)
+    return basis @ small_u[:, :rank], s[:rank], vt[:rank]
+
+
+class LsiIndex:
+    def __init__(
+        self,
+        corpus: Union[Corpus, AnalyzedCorpus, VectorSpaceSearcher],
+        rank: int = 200,
+        use_lucene: bool = True,
+        workers: int = 1,
+        oversample: int = 10,
+        power_iters: int = 2,
+        chunk_rows: int = 4096,
+        seed: int = 0,
+    ):
+        # Reuses the TF-IDF vocabulary, idf and query vectorization of a VectorSpaceSearcher
+        if isinstance(corpus, VectorSpaceSearcher):
+            self.vector_space = corpus
+        else:
+            self.vector_space = VectorSpaceSearcher(corpus, use_lucene=use_lucene, workers=workers)
+        self.doc_ids = self.vector_space.doc_ids
+        doc_matrix = self.vector_space.doc_matrix
+        _u, s, vt = randomized_svd(
+            doc_matrix, rank, oversample=oversample, power_iters=power_iters, chunk_rows=chunk_rows, seed=seed
+        )
+        self.singular_values = s
+        self.term_vectors = np.ascontiguousarray(vt.T, dtype=np.float32)  # terms x rank
+        self.doc_embeddings = _times(doc_matrix, self.term_vectors, chunk_rows, dtype=np.float32)  # docs x rank
+        norms = np.linalg.norm(self.doc_embeddings, axis=1)
+        self._unit_docs = self.doc_embeddings / np.where(norms > 0, norms, 1.0)[:, None]
+
+    @property
+    def rank(self) -> int:
+        return self.doc_embeddings.shape[1]
+
+    def fold_in(self, queries: Sequence[str]) -> "np.ndarray":
+        """Latent vectors (queries x rank) for queries, comparable to doc_embeddings."""
+        return np.asarray(self.vector_space.vectorize(queries) @ self.term_vectors, dtype=np.float32)
+
+    def search_many(self, queries: Sequence[str], k: int = 10, block: int = 1024) -> List[List[Tuple[str, float]]]:
+        """Top-k (doc_id, cosine in the latent space) per query, best first."""
+        vectors = self.fold_in(queries)
+        k = min(k, len(self.doc_ids))
+        if k <= 0:
+            return [[] for _ in range(len(vectors))]
+        norms = np.linalg.norm(vectors, axis=1)
+        vectors /= np.where(norms > 0, norms, 1.0)[:, None]
+        results: List[List[Tuple[str, float]]] = []
+        for start in range(0, len(vectors), block):
+            top, top_scores = top_k(vectors[start : start + block] @ self._unit_docs.T, k)
+            for docs_row, scores_row, norm in zip(top.tolist(), top_scores.tolist(), norms[start : start + block]):
+                # A query sharing no term with the vocabulary has no direction to compare
+                results.append([(self.doc_ids[d], s) for d, s in zip(docs_row, scores_row)] if norm > 0 else [])
+        return results
+
+    def search(self, query: str, k: int = 10) -> List[Tuple[str, float]]:
+        return self.search_many([query], k=k)[0]
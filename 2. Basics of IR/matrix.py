@@ -1,40 +1,236 @@
-from typing import Dict, List, Tuple
+from typing import Dict, List, Optional, Tuple, Union
 import math
 
-from representation import Corpus, Document, build_controlled_vocabulary, bag_of_words
+from representation import AnalyzedCorpus, Corpus, Document, build_controlled_vocabulary, bag_of_words
 
+# Term-document and TF-IDF matrices. By default both are sparse CSR matrices
+# (documents are rows, terms are columns in sorted term order) built with NumPy:
+# scipy.sparse.csr_matrix when SciPy is installed, otherwise CSRMatrix below, which
+# exposes the same data/indices/indptr arrays. dense=True keeps the original
+# List[List[...]] output, which needs neither library and suits small demos.
 
-def term_document_matrix(corpus: Corpus, use_lucene: bool = True) -> Tuple[List[str], List[str], List[List[int]]]:
-    vocab = build_controlled_vocabulary(corpus, use_lucene=use_lucene)
+try:
+    import numpy as np  # type: ignore
+
+    _HAS_NUMPY = True
+except ImportError:
+    _HAS_NUMPY = False
+
+try:
+    import scipy.sparse as sp  # type: ignore
+
+    _HAS_SCIPY = True
+except ImportError:
+    _HAS_SCIPY = False
+
+# Documents converted per vectorized step; bounds the temporary token arrays
+_CHUNK_DOCS = 4096
+
+
+class CSRMatrix:
+    """
+    Minimal compressed sparse row matrix over NumPy arrays, used when SciPy is not
+    installed: row i holds data[indptr[i]:indptr[i+1]] at columns
+    indices[indptr[i]:indptr[i+1]], with columns sorted within a row.
+    """
+
+    def __init__(self, data, indices, indptr, shape: Tuple[int, int]):
+        self.data = data
+        self.indices = indices
+        self.indptr = indptr
+        self.shape = shape
+
+    @property
+    def nnz(self) -> int:
+        return len(self.data)
+
+    def toarray(self):
+        out = np.zeros(self.shape, dtype=self.data.dtype)
+        out[row_ids(self), self.indices] = self.data
+        return out
+
+    def transpose(self) -> "CSRMatrix":
+        # A stable sort by column keeps each new row's columns (old rows) ascending
+        order = np.argsort(self.indices, kind="stable")
+        indptr = np.zeros(self.shape[1] + 1, dtype=np.int64)
+        np.cumsum(np.bincount(self.indices, minlength=self.shape[1]), out=indptr[1:])
+        rows = row_ids(self)[order].astype(self.indices.dtype)
+        return CSRMatrix(self.data[order], rows, indptr, (self.shape[1], self.shape[0]))
+
+    def __matmul__(self, other):
+        # Sparse @ dense
+        other = np.asarray(other)
+        out = np.zeros((self.shape[0],) + other.shape[1:], dtype=np.result_type(self.data, other))
+        np.add.at(out, row_ids(self), self.data.reshape((-1,) + (1,) * (other.ndim - 1)) * other[self.indices])
+        return out
+
+
+def require_numpy():
+    if not _HAS_NUMPY:
+        raise ImportError("Sparse matrices need NumPy (pip install numpy); pass dense=True for nested lists")
+
+
+def csr_matrix(data, indices, indptr, shape: Tuple[int, int]):
+    if _HAS_SCIPY:
+        return sp.csr_matrix((data, indices, indptr), shape=shape)
+    return CSRMatrix(data, indices, indptr, shape)
+
+
+def transposed(matrix):
+    # Transpose of a CSR matrix, again in CSR form
+    if isinstance(matrix, CSRMatrix):
+        return matrix.transpose()
+    return matrix.T.tocsr()
+
+
+def transpose_matmul(matrix, other):
+    # matrix.T @ dense without building the transpose: scipy's .T is a CSC view of
+    # the same arrays, and a CSRMatrix entry (r, c) adds its weight times row r of
+    # `other` to row c of the result
+    if not isinstance(matrix, CSRMatrix):
+        return matrix.T @ other
+    other = np.asarray(other)
+    out = np.zeros((matrix.shape[1],) + other.shape[1:], dtype=np.result_type(matrix.data, other))
+    np.add.at(out, matrix.indices, matrix.data.reshape((-1,) + (1,) * (other.ndim - 1)) * other[row_ids(matrix)])
+    return out
+
+
+def row_slice(matrix, start: int, stop: int):
+    # Rows [start, stop) of a CSR matrix, sharing its arrays
+    if not isinstance(matrix, CSRMatrix):
+        return matrix[start:stop]
+    lo, hi = matrix.indptr[start], matrix.indptr[stop]
+    return CSRMatrix(
+        matrix.data[lo:hi], matrix.indices[lo:hi], matrix.indptr[start : stop + 1] - lo, (stop - start, matrix.shape[1])
+    )
+
+
+def row_ids(matrix):
+    # Row number of every stored entry of a CSR matrix
+    return np.repeat(np.arange(matrix.shape[0]), np.diff(matrix.indptr))
+
+
+def _sorted_terms(vocab: Dict[str, int]) -> List[str]:
     terms = [None] * len(vocab)
     for t, i in vocab.items():
         terms[i] = t
-    docs = [d.doc_id for d in corpus]
+    return terms
+
+
+def count_matrix(corpus: AnalyzedCorpus, vocab: Dict[str, int]):
+    # CSR counts, converted _CHUNK_DOCS documents at a time: map token IDs to columns,
+    # then one np.unique over (row, column) keys yields the sorted entries and counts
+    num_terms = len(vocab)
+    remap = np.asarray(corpus.vocabulary_map(vocab), dtype=np.int64)
+    data, indices, row_counts = [], [], []
+    for start in range(0, len(corpus), _CHUNK_DOCS):
+        chunk = corpus.doc_terms[start : start + _CHUNK_DOCS]
+        lengths = np.fromiter((len(ids) for ids in chunk), dtype=np.int64, count=len(chunk))
+        tokens = np.concatenate([np.frombuffer(ids, dtype=np.uint32) for ids in chunk] or [np.empty(0, np.uint32)])
+        cols = remap[tokens]
+        rows = np.repeat(np.arange(len(chunk), dtype=np.int64), lengths)
+        keep = cols >= 0
+        keys, counts = np.unique(rows[keep] * num_terms + cols[keep], return_counts=True)
+        data.append(counts)
+        indices.append(keys % num_terms)
+        row_counts.append(np.bincount(keys // num_terms, minlength=len(chunk)))
+    indptr = np.zeros(len(corpus) + 1, dtype=np.int64)
+    if row_counts:
+        np.cumsum(np.concatenate(row_counts), out=indptr[1:])
+    return csr_matrix(
+        np.concatenate(data or [np.empty(0, np.int64)]).astype(np.int32),
+        np.concatenate(indices or [np.empty(0, np.int64)]).astype(np.int32),
+        indptr,
+        (len(corpus), num_terms),
+    )
+
+
+def term_document_matrix(
+    corpus: Union[Corpus, AnalyzedCorpus], use_lucene: bool = True, workers: int = 1, dense: bool = False
+):
+    """
+    Returns (terms, doc_ids, matrix) where matrix[d, t] is the count of term t in
+    document d: a CSR matrix, or nested lists when dense=True.
+    """
+    if not isinstance(corpus, AnalyzedCorpus):
+        corpus = AnalyzedCorpus(corpus, use_lucene=use_lucene, workers=workers)
+    vocab = build_controlled_vocabulary(corpus)
+    terms = _sorted_terms(vocab)
+    docs = list(corpus.doc_ids)
+    if not dense:
+        require_numpy()
+        return terms, docs, count_matrix(corpus, vocab)
+    remap = corpus.vocabulary_map(vocab)
     matrix: List[List[int]] = []
-    for doc in corpus:
-        bow = bag_of_words(doc, vocab, use_lucene=use_lucene)
+    for _doc_id, term_ids in corpus:
         row = [0] * len(terms)
-        for term_id, count in bow.items():
-            row[term_id] = count
+        for t in term_ids:
+            if remap[t] >= 0:
+                row[remap[t]] += 1
         matrix.append(row)
     return terms, docs, matrix
 
-# TF–IDF = (term frequency weight) × (inverse document frequency). Typical IDF gives higher weight to terms that occur in fewer documents.
+# TF–IDF = (term frequency weight) × (inverse document frequency). Typical IDF gives
+# higher weight to terms that occur in fewer documents.
+
+
+def idf_weights(doc_freqs, num_docs: int):
+    # Smoothed idf; doc_freqs is a sequence (dense) or a NumPy array (sparse)
+    if _HAS_NUMPY and isinstance(doc_freqs, np.ndarray):
+        return np.log((num_docs + 1) / (doc_freqs + 1.0)) + 1.0
+    return [math.log((num_docs + 1) / (df_j + 1)) + 1.0 for df_j in doc_freqs]
+
 
-def tf_idf_matrix(corpus: Corpus, use_lucene: bool = True) -> Tuple[List[str], List[str], List[List[float]]]:
-    terms, docs, counts = term_document_matrix(corpus, use_lucene=use_lucene)
+def tf_idf_weights(counts, lengths, idf, sublinear_tf: bool = False, norm: Optional[str] = None):
+    # Vectorized weighting of a CSR count matrix; `lengths` are the rows' token counts
+    rows = row_ids(counts)
+    data = counts.data.astype(np.float64)
+    if sublinear_tf:
+        data = 1.0 + np.log(data)
+    else:
+        data /= np.maximum(np.asarray(lengths, dtype=np.float64), 1.0)[rows]
+    data *= idf[counts.indices]
+    if norm == "l2":
+        norms = np.sqrt(np.bincount(rows, weights=data * data, minlength=counts.shape[0]))
+        data /= np.where(norms > 0, norms, 1.0)[rows]
+    return csr_matrix(data, counts.indices, counts.indptr, counts.shape)
+
+
+def tf_idf_matrix(
+    corpus: Union[Corpus, AnalyzedCorpus],
+    use_lucene: bool = True,
+    workers: int = 1,
+    dense: bool = False,
+    sublinear_tf: bool = False,
+    norm: Optional[str] = None,
+):
+    """
+    Returns (terms, doc_ids, matrix) of TF-IDF weights. The tf weight is the count
+    divided by the document length, or 1 + ln(count) with sublinear_tf=True;
+    norm="l2" scales every document row to unit length.
+    """
+    if norm not in (None, "l2"):
+        raise ValueError(f"Unsupported norm: {norm!r}")
+    if not isinstance(corpus, AnalyzedCorpus):
+        corpus = AnalyzedCorpus(corpus, use_lucene=use_lucene, workers=workers)
+    terms, docs, counts = term_document_matrix(corpus, dense=dense)
     num_docs = len(docs)
-    # compute df
-    df = [0] * len(terms)
-    for row in counts:
-        for j, c in enumerate(row):
-            if c > 0:
-                df[j] += 1
-    idf = [math.log((num_docs + 1) / (df_j + 1)) + 1.0 for df_j in df]
+    # df and doc lengths were counted when the corpus was analyzed
+    term_to_id = corpus.term_to_id
+    df = [corpus.doc_freqs[term_to_id[t]] for t in terms]
+    if not dense:
+        idf = idf_weights(np.asarray(df, dtype=np.float64), num_docs)
+        return terms, docs, tf_idf_weights(counts, corpus.doc_lengths, idf, sublinear_tf=sublinear_tf, norm=norm)
+    idf = idf_weights(df, num_docs)
     tfidf: List[List[float]] = []
-    for row in counts:
-        row_sum = sum(row) or 1
-        tfidf.append([ (c / row_sum) * idf[j] for j, c in enumerate(row)])
+    for row, length in zip(counts, corpus.doc_lengths):
+        row_sum = length or 1
+        if sublinear_tf:
+            weights = [(1.0 + math.log(c)) * idf[j] if c else 0.0 for j, c in enumerate(row)]
+        else:
+            weights = [ (c / row_sum) * idf[j] for j, c in enumerate(row)]
+        if norm == "l2":
+            length_l2 = math.sqrt(sum(w * w for w in weights)) or 1.0
+            weights = [w / length_l2 for w in weights]
+        tfidf.append(weights)
     return terms, docs, tfidf
-
-
@@ -0,0 +1,194 @@
+import sys
+from array import array
+from typing import Iterable, Iterator, List, Optional, Sequence, Tuple
+
+# Variable-byte (vbyte) codec for gap-encoded postings.
+# Each posting list is two byte buffers:
+#   docs:      vbyte(doc gap), vbyte(tf)   per posting
+#   positions: vbyte(position gap) * tf    per posting
+# Doc numbers and positions are strictly increasing, so gaps stay small and most
+# values fit in a single byte.
+#
+# Lists longer than SKIP_INTERVAL postings also carry skip pointers: a flat
+# array('Q') of (base doc, docs offset, positions offset) triples, one per block of
+# SKIP_INTERVAL postings, where base doc is the last doc number before the block.
+
+SKIP_INTERVAL = 32
+NO_MORE_DOCS = sys.maxsize
+
+
+def vbyte_encode(n: int, out: bytearray):
+    # 7 payload bits per byte; the high bit marks the last byte of a value
+    while n >= 128:
+        out.append(n & 127)
+        n >>= 7
+    out.append(n | 128)
+
+
+def vbyte_decode(buf, pos: int) -> Tuple[int, int]:
+    n = 0
+    shift = 0
+    while True:
+        b = buf[pos]
+        pos += 1
+        if b & 128:
+            return n | ((b & 127) << shift), pos
+        n |= b << shift
+        shift += 7
+
+
+def encode_posting(docs: bytearray, positions: bytearray, doc_gap: int, pos_list: Iterable[int]):
+    start = len(positions)
+    prev = 0
+    tf = 0
+    for p in pos_list:
+        vbyte_encode(p - prev, positions)
+        prev = p
+        tf += 1
+    if tf == 0:
+        del positions[start:]
+        raise ValueError("a posting needs at least one position")
+    vbyte_encode(doc_gap, docs)
+    vbyte_encode(tf, docs)
+
+
+def decode_doc_postings(docs) -> Iterator[Tuple[int, int]]:
+    # (doc number, tf) pairs; positions are never touched
+    pos = 0
+    doc = 0
+    end = len(docs)
+    while pos < end:
+        gap, pos = vbyte_decode(docs, pos)
+        tf, pos = vbyte_decode(docs, pos)
+        doc += gap
+        yield doc, tf
+
+
+def decode_positions(positions, pos: int, tf: int) -> Tuple[List[int], int]:
+    result: List[int] = []
+    p = 0
+    for _ in range(tf):
+        gap, pos = vbyte_decode(positions, pos)
+        p += gap
+        result.append(p)
+    return result, pos
+
+
+def decode_postings(docs, positions) -> Iterator[Tuple[int, List[int]]]:
+    ppos = 0
+    for doc, tf in decode_doc_postings(docs):
+        pos_list, ppos = decode_positions(positions, ppos, tf)
+        yield doc, pos_list
+
+
+class PostingsWriter:
+    """
+    Builds one encoded postings list from (doc, positions) pairs in increasing doc
+    order: the standalone counterpart of InvertedIndex's per-term arrays, used when
+    lists are built or merged one term at a time.
+    """
+
+    __slots__ = ("docs", "positions", "skips", "df", "max_tf", "cf", "last_doc", "with_skips")
+
+    def __init__(self, with_skips: bool = True):
+        self.docs = bytearray()
+        self.positions = bytearray()
+        self.skips = array("Q")
+        self.df = 0
+        self.max_tf = 0
+        self.cf = 0
+        self.last_doc = 0
+        self.with_skips = with_skips
+
+    def add(self, doc: int, pos_list: List[int]):
+        if self.with_skips and self.df and self.df % SKIP_INTERVAL == 0:
+            self.skips.extend((self.last_doc, len(self.docs), len(self.positions)))
+        encode_posting(self.docs, self.positions, doc - self.last_doc, pos_list)
+        self.last_doc = doc
+        self.df += 1
+        self.cf += len(pos_list)
+        if len(pos_list) > self.max_tf:
+            self.max_tf = len(pos_list)
+
+
+class PostingsCursor:
+    """
+    Forward-only iterator over one encoded postings list. advance(target) gallops
+    over the skip pointers (exponential then binary search) to the last block that
+    can still hold `target`, and only decodes from there on.
+    """
+
+    def __init__(self, docs, positions=b"", skips: Optional[Sequence[int]] = None, df: int = 0):
+        self.docs = docs
+        self.positions = positions
+        self.skips = skips if skips is not None else ()
+        self.df = df
+        self.doc = -1
+        self.tf = 0
+        self._pos = 0  # byte offset of the next posting in docs
+        self._base = 0  # gap base for the next posting
+        self._ppos = 0  # byte offset in positions, before any pending skip
+        self._pending = 0  # position values to skip before the current posting's
+        self._skip_idx = 0  # first skip entry that is still ahead of us
+        self._positions: Optional[List[int]] = None  # decoded positions of the current posting
+
+    @property
+    def cost(self) -> int:
+        return self.df
+
+    def next_doc(self) -> int:
+        if self._positions is None:
+            self._pending += self.tf
+        self._positions = None
+        if self._pos >= len(self.docs):
+            self.doc = NO_MORE_DOCS
+            self.tf = 0
+            return self.doc
+        gap, self._pos = vbyte_decode(self.docs, self._pos)
+        self.tf, self._pos = vbyte_decode(self.docs, self._pos)
+        self._base += gap
+        self.doc = self._base
+        return self.doc
+
+    def advance(self, target: int) -> int:
+        # First doc >= target
+        if self.doc >= target:
+            return self.doc
+        skips = self.skips
+        n = len(skips) // 3
+        lo = self._skip_idx
+        if lo < n and skips[3 * lo] < target:
+            step = 1
+            hi = lo
+            while hi + step < n and skips[3 * (hi + step)] < target:
+                hi += step
+                step *= 2
+            # skips[3 * hi] < target; binary search for the last such entry
+            top = min(hi + step, n)
+            while top - hi > 1:
+                mid = (hi + top) // 2
+                if skips[3 * mid] < target:
+                    hi = mid
+                else:
+                    top = mid
+            if skips[3 * hi + 1] >= self._pos:
+                self._base = skips[3 * hi]
+                self._pos = skips[3 * hi + 1]
+                self._ppos = skips[3 * hi + 2]
+                self._pending = 0
+                self.tf = 0
+                self._positions = None
+            self._skip_idx = hi + 1
+        while self.doc < target:
+            self.next_doc()
+        return self.doc
+
+    def doc_positions(self) -> List[int]:
+        # Positions of the current posting, decoded on first request
+        if self._positions is None:
+            ppos = self._ppos
+            for _ in range(self._pending):
+                _gap, ppos = vbyte_decode(self.positions, ppos)
+            self._positions, self._ppos = decode_positions(self.positions, ppos, self.tf)
+            self._pending = 0
+        return self._positions
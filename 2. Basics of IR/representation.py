@@ -1,7 +1,17 @@
+import heapq
+import json
+import mmap
+import os
+import tempfile
+from array import array
+from collections import deque
+from itertools import groupby
 from dataclasses import dataclass
-from typing import Dict, List, Iterable
+from pathlib import Path
+from typing import Dict, List, Iterable, Iterator, Optional, Tuple, Union
 
-from text_processing import process_text
+from index_store import MappedFile, MappedStrings, StringsWriter
+from text_processing import process_text, process_many
 
 
 @dataclass
@@ -24,17 +34,319 @@ class Corpus:
     def __len__(self) -> int:
         return len(self.documents)
 
-    def all_tokens(self, use_lucene: bool = True) -> Iterable[str]:
-        for doc in self.documents:
-            for tok in doc.tokens(use_lucene=use_lucene):
+    def analyze(self, use_lucene: bool = True, workers: int = 1) -> Iterator[Tuple[Document, List[str]]]:
+        return analyze_documents(iter(self), use_lucene=use_lucene, workers=workers)
+
+    def all_tokens(self, use_lucene: bool = True, workers: int = 1) -> Iterable[str]:
+        for _doc, tokens in self.analyze(use_lucene=use_lucene, workers=workers):
+            for tok in tokens:
                 yield tok
 
 
-def build_controlled_vocabulary(corpus: Corpus, min_freq: int = 1, use_lucene: bool = True) -> Dict[str, int]:
+class DiskCorpus(Corpus):
+    """
+    Corpus streamed from disk instead of held in memory. `source` is either a JSONL
+    file (one {"doc_id", "title", "text"} object per line) or a directory of
+    .txt/.md files (doc_id = relative path). Iteration reads one document at a time.
+
+    For JSONL, a byte-offset index is written next to the file and reused while the
+    source is unchanged: `<source>.offsets.ids` holds the doc_ids in sorted order
+    (write_strings format), `<source>.offsets.pos` the (offset, length) pairs in the
+    same order as array('Q'), and `<source>.offsets` (written last) the source's
+    size/mtime and the count. Both arrays are mmapped, so get(doc_id) is a binary
+    search plus a read from an mmap of the file, and nothing grows with the corpus.
+
+    Iteration and len() never write the offset index (len() counts lines unless a
+    current index already holds the count). The first `in` or get() on a JSONL
+    corpus builds it in one pass over the source and writes it next to the source,
+    so that directory must be writable. doc_ids must be unique: building the index
+    raises ValueError on a doc_id that appears on more than one line.
+    """
+
+    TEXT_SUFFIXES = {".txt", ".md"}
+    RUN_SIZE = 100000  # offset entries sorted in memory at once while building
+
+    def __init__(self, source: str):
+        self.source = Path(source)
+        self.is_dir = self.source.is_dir()
+        self._count: Optional[int] = None
+        self._ids: Optional[MappedStrings] = None
+        self._pos_file: Optional[MappedFile] = None
+        self._pos = None
+        self._file = None
+        self._mmap = None
+
+    @property
+    def documents(self) -> Iterator[Document]:
+        return iter(self)
+
+    def __iter__(self) -> Iterator[Document]:
+        if self.is_dir:
+            for doc_id, path in self._iter_files():
+                yield self._read_file(doc_id, path)
+            return
+        with open(self.source, "rb") as f:
+            for line in f:
+                if line.strip():
+                    yield self._parse_record(line)
+
+    def __len__(self) -> int:
+        if self._count is None:
+            if self.is_dir:
+                self._count = sum(1 for _ in self._iter_files())
+            else:
+                meta = self._offsets_meta()
+                if meta is not None:
+                    self._count = meta["count"]
+                else:
+                    with open(self.source, "rb") as f:
+                        self._count = sum(1 for line in f if line.strip())
+        return self._count
+
+    def _iter_files(self) -> Iterator[Tuple[str, Path]]:
+        for root, dirs, files in os.walk(self.source):
+            dirs.sort()
+            for fname in sorted(files):
+                fp = Path(root) / fname
+                if fp.suffix.lower() in self.TEXT_SUFFIXES:
+                    yield fp.relative_to(self.source).as_posix(), fp
+
+    def _file_path(self, doc_id: str) -> Optional[Path]:
+        # Path of a directory corpus document, None if doc_id names no such file
+        rel = Path(doc_id)
+        if rel.is_absolute() or ".." in rel.parts or rel.as_posix() != doc_id:
+            return None
+        path = self.source / rel
+        if path.suffix.lower() not in self.TEXT_SUFFIXES or not path.is_file():
+            return None
+        return path
+
+    @staticmethod
+    def _read_file(doc_id: str, path: Path) -> Document:
+        try:
+            text = path.read_text(encoding="utf-8", errors="ignore")
+        except Exception:
+            text = ""
+        return Document(doc_id=doc_id, title=path.stem, text=text)
+
+    @staticmethod
+    def _parse_record(line: bytes) -> Document:
+        rec = json.loads(line)
+        return Document(doc_id=str(rec["doc_id"]), title=rec.get("title", ""), text=rec.get("text", ""))
+
+    def _offsets_path(self, suffix: str = "") -> str:
+        return str(self.source.with_name(self.source.name + ".offsets" + suffix))
+
+    def _source_stamp(self) -> str:
+        st = self.source.stat()
+        return f"{st.st_size} {st.st_mtime_ns}"
+
+    def _offsets_meta(self) -> Optional[dict]:
+        # Metadata of the offset index, None if it is missing or stale (the source changed since)
+        if not os.path.exists(self._offsets_path()):
+            return None
+        with open(self._offsets_path(), encoding="utf-8") as f:
+            meta = json.load(f)
+        return meta if meta.get("stamp") == self._source_stamp() else None
+
+    def _open_offsets(self):
+        if self._ids is not None:
+            return
+        meta = self._offsets_meta()
+        if meta is None:
+            meta = self.build_offsets()
+        self._count = meta["count"]
+        self._ids = MappedStrings(self._offsets_path(".ids"))
+        self._pos_file = MappedFile(self._offsets_path(".pos"))
+        self._pos = self._pos_file.view("Q")
+
+    def _offset_runs(self) -> List[Iterator[Tuple[str, int, int]]]:
+        # Sorted runs of (doc_id, offset, length), RUN_SIZE entries each; all but a
+        # single run are spilled to temporary files so memory stays bounded
+        runs: List[Iterator[Tuple[str, int, int]]] = []
+        run: List[Tuple[str, int, int]] = []
+
+        def spill():
+            run.sort()
+            f = tempfile.TemporaryFile("w+", encoding="utf-8")
+            for entry in run:
+                f.write(json.dumps(entry) + "\n")
+            f.seek(0)
+            runs.append(tuple(e) for e in map(json.loads, f))
+            run.clear()
+
+        pos = 0
+        with open(self.source, "rb") as f:
+            for line in f:
+                if line.strip():
+                    run.append((self._parse_record(line).doc_id, pos, len(line)))
+                    if len(run) >= self.RUN_SIZE:
+                        spill()
+                pos += len(line)
+        if run:
+            if runs:
+                spill()
+            else:
+                run.sort()
+                runs.append(iter(run))
+        return runs
+
+    def build_offsets(self) -> dict:
+        stamp = self._source_stamp()
+        count = 0
+        with StringsWriter(self._offsets_path(".ids")) as ids, open(self._offsets_path(".pos"), "wb") as pos:
+            # Entries of one doc_id are adjacent after the merge, so a duplicate is the next entry
+            for doc_id, group in groupby(heapq.merge(*self._offset_runs()), key=lambda e: e[0]):
+                (_, off, length), *duplicates = group
+                if duplicates:
+                    raise ValueError(f"{self.source}: doc_id {doc_id!r} appears on more than one line")
+                ids.write(doc_id)
+                array("Q", [off, length]).tofile(pos)
+                count += 1
+        meta = {"stamp": stamp, "count": count}
+        with open(self._offsets_path(), "w", encoding="utf-8") as f:
+            json.dump(meta, f)
+        return meta
+
+    def get(self, doc_id: str) -> Document:
+        if self.is_dir:
+            path = self._file_path(doc_id)
+            if path is None:
+                raise KeyError(doc_id)
+            return self._read_file(doc_id, path)
+        self._open_offsets()
+        i = self._ids.find(doc_id)
+        if i < 0:
+            raise KeyError(doc_id)
+        off, length = self._pos[2 * i], self._pos[2 * i + 1]
+        if self._mmap is None:
+            self._file = open(self.source, "rb")
+            self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        return self._parse_record(self._mmap[off : off + length])
+
+    def __contains__(self, doc_id: str) -> bool:
+        if self.is_dir:
+            return self._file_path(doc_id) is not None
+        self._open_offsets()
+        return self._ids.find(doc_id) >= 0
+
+    def close(self):
+        if self._mmap is not None:
+            self._mmap.close()
+            self._file.close()
+            self._mmap = self._file = None
+        if self._ids is not None:
+            self._ids.close()
+            self._pos_file.close()
+            self._ids = self._pos_file = self._pos = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def analyze_documents(
+    documents: Iterable[Document], use_lucene: bool = True, workers: int = 1
+) -> Iterator[Tuple[Document, List[str]]]:
+    # Yields (doc, tokens) in input order; workers > 1 analyzes in a process pool
+    if workers <= 1:
+        for doc in documents:
+            yield doc, doc.tokens(use_lucene=use_lucene)
+        return
+    in_flight: deque = deque()
+
+    def texts():
+        for doc in documents:
+            in_flight.append(doc)
+            yield doc.text
+
+    for tokens in process_many(texts(), use_lucene=use_lucene, workers=workers):
+        yield in_flight.popleft(), tokens
+
+
+class AnalyzedCorpus:
+    """
+    A corpus analyzed exactly once. Each document's token stream is kept as an
+    array('I') of term IDs (assigned in first-seen order); vocabulary building,
+    bag-of-words, the inverted index and the matrices all read from this cache.
+    """
+
+    def __init__(self, documents: Iterable[Document], use_lucene: bool = True, workers: int = 1):
+        self.use_lucene = use_lucene
+        self.doc_ids: List[str] = []
+        self.doc_terms: List[array] = []
+        self.term_to_id: Dict[str, int] = {}
+        self.id_to_term: List[str] = []
+        self.term_counts = array("I")  # collection frequency per term ID
+        self.doc_freqs = array("I")  # document frequency per term ID
+        self.doc_lengths = array("I")
+        self.total_tokens = 0
+        for doc, tokens in analyze_documents(documents, use_lucene=use_lucene, workers=workers):
+            self.add(doc.doc_id, tokens)
+
+    def add(self, doc_id: str, tokens: Iterable[str]):
+        term_to_id = self.term_to_id
+        counts = self.term_counts
+        doc_freqs = self.doc_freqs
+        ids = array("I")
+        for tok in tokens:
+            term_id = term_to_id.get(tok)
+            if term_id is None:
+                term_id = len(self.id_to_term)
+                term_to_id[tok] = term_id
+                self.id_to_term.append(tok)
+                counts.append(0)
+                doc_freqs.append(0)
+            counts[term_id] += 1
+            ids.append(term_id)
+        for term_id in set(ids):
+            doc_freqs[term_id] += 1
+        self.doc_lengths.append(len(ids))
+        self.total_tokens += len(ids)
+        self.doc_ids.append(doc_id)
+        self.doc_terms.append(ids)
+
+    def __len__(self) -> int:
+        return len(self.doc_ids)
+
+    def __iter__(self) -> Iterator[Tuple[str, array]]:
+        return zip(self.doc_ids, self.doc_terms)
+
+    def tokens(self, i: int) -> List[str]:
+        id_to_term = self.id_to_term
+        return [id_to_term[t] for t in self.doc_terms[i]]
+
+    def iter_tokens(self) -> Iterator[Tuple[str, List[str]]]:
+        for i, doc_id in enumerate(self.doc_ids):
+            yield doc_id, self.tokens(i)
+
+    def vocabulary_map(self, vocabulary: Dict[str, int]) -> List[int]:
+        # Internal term ID -> vocabulary ID (-1 when the term is not in the vocabulary)
+        return [vocabulary.get(t, -1) for t in self.id_to_term]
+
+    def bag_of_words(self, i: int, vocabulary: Dict[str, int], remap: List[int] = None) -> Dict[int, int]:
+        if remap is None:
+            remap = self.vocabulary_map(vocabulary)
+        bow: Dict[int, int] = {}
+        for t in self.doc_terms[i]:
+            term_id = remap[t]
+            if term_id >= 0:
+                bow[term_id] = bow.get(term_id, 0) + 1
+        return bow
+
+
+def build_controlled_vocabulary(
+    corpus: Union[Corpus, AnalyzedCorpus], min_freq: int = 1, use_lucene: bool = True, workers: int = 1
+) -> Dict[str, int]:
     term_to_id: Dict[str, int] = {}
     term_freq: Dict[str, int] = {}
-    for tok in corpus.all_tokens(use_lucene=use_lucene):
-        term_freq[tok] = term_freq.get(tok, 0) + 1
+    if isinstance(corpus, AnalyzedCorpus):
+        term_freq = dict(zip(corpus.id_to_term, corpus.term_counts))
+    else:
+        for tok in corpus.all_tokens(use_lucene=use_lucene, workers=workers):
+            term_freq[tok] = term_freq.get(tok, 0) + 1
     for term, freq in sorted(term_freq.items()):
         if freq >= min_freq:
             term_to_id[term] = len(term_to_id)
@@ -1,7 +1,9 @@
 from typing import List
 
-from representation import Document, Corpus, build_controlled_vocabulary, bag_of_words
+from representation import AnalyzedCorpus, Document, Corpus, build_controlled_vocabulary
 from inverted_index import InvertedIndex
+from boolean_search import BooleanSearcher
+from bm25 import BM25Searcher
 from matrix import term_document_matrix, tf_idf_matrix
 from text_processing import process_text
 
@@ -23,44 +25,68 @@ def demonstrate_text_processing():
     print("tokens (no lucene):", process_text(text, use_lucene=False))
 
 
-def demonstrate_document_representation(corpus: Corpus):
+def demonstrate_document_representation(corpus: Corpus, analyzed: AnalyzedCorpus):
     print("\n=== Document representation ===")
-    for d in corpus:
-        print(d.doc_id, d.title, "->", d.tokens(use_lucene=True))
+    for i, d in enumerate(corpus):
+        print(d.doc_id, d.title, "->", analyzed.tokens(i))
 
 
-def demonstrate_controlled_vocabulary(corpus: Corpus):
+def demonstrate_controlled_vocabulary(corpus: AnalyzedCorpus):
     print("\n=== Controlled vocabulary ===")
-    vocab = build_controlled_vocabulary(corpus, min_freq=1, use_lucene=True)
+    vocab = build_controlled_vocabulary(corpus, min_freq=1)
     print("size:", len(vocab))
     print("sample terms:", sorted(list(vocab.keys()))[:15])
     return vocab
 
 
-def demonstrate_free_text_representation(corpus: Corpus, vocab):
+def demonstrate_free_text_representation(corpus: AnalyzedCorpus, vocab):
     print("\n=== Free text representation (bag-of-words) ===")
-    for d in corpus:
-        print(d.doc_id, bag_of_words(d, vocab, use_lucene=True))
+    remap = corpus.vocabulary_map(vocab)
+    for i, doc_id in enumerate(corpus.doc_ids):
+        print(doc_id, corpus.bag_of_words(i, vocab, remap))
 
 
-def demonstrate_inverted_index(corpus: Corpus):
+def demonstrate_inverted_index(corpus: AnalyzedCorpus) -> InvertedIndex:
     print("\n=== Inverted index ===")
     idx = InvertedIndex()
-    idx.build(corpus, use_lucene=True)
+    idx.build(corpus)
     for term in idx.vocabulary()[:10]:
         print(term, "->", idx.postings(term))
+    return idx
 
 
-def demonstrate_term_document_matrix(corpus: Corpus):
+def demonstrate_boolean_search(idx: InvertedIndex):
+    print("\n=== Boolean retrieval ===")
+    searcher = BooleanSearcher(idx, use_lucene=True)
+    for q in ["cats AND mice", "birds OR mice", "dogs AND NOT (birds OR hunts)"]:
+        print(q, "->", searcher.search(q))
+    print("\n=== Phrase and proximity queries ===")
+    for q in ['"cats chase mice"', '"cats mice"~1', "birds NEAR/3 dogs"]:
+        print(q, "->", searcher.search(q))
+    # A repeated term needs as many distinct occurrences: only D1 chases twice
+    for q, expected in [('"chase chase"~3', ["D1"]), ('"dogs dogs"~3', []), ("birds NEAR/5 birds", ["D3"])]:
+        result = searcher.search(q)
+        assert result == expected, (q, result)
+        print(q, "->", result)
+
+
+def demonstrate_bm25(idx: InvertedIndex):
+    print("\n=== BM25 ranking (k1=1.2, b=0.75) ===")
+    searcher = BM25Searcher(idx, k1=1.2, b=0.75, use_lucene=True)
+    for q in ["cats mice", "dogs birds"]:
+        print(q, "->", [(doc_id, round(score, 3)) for doc_id, score in searcher.search(q, k=3)])
+
+
+def demonstrate_term_document_matrix(corpus: AnalyzedCorpus):
     print("\n=== Term-document incidence matrix ===")
-    terms, docs, mat = term_document_matrix(corpus, use_lucene=True)
+    terms, docs, mat = term_document_matrix(corpus, dense=True)
     print("terms:", terms)
     print("docs:", docs)
     print("matrix:")
     for row in mat:
         print(row)
     print("\n=== TF-IDF (optional) ===")
-    _, _, tfidf = tf_idf_matrix(corpus, use_lucene=True)
+    _, _, tfidf = tf_idf_matrix(corpus, dense=True)
     for row in tfidf:
         print([round(x, 3) for x in row])
 
@@ -68,10 +94,14 @@ def demonstrate_term_document_matrix(corpus: Corpus):
 if __name__ == "__main__":
     c = sample_corpus()
     demonstrate_text_processing()
-    demonstrate_document_representation(c)
-    vocab = demonstrate_controlled_vocabulary(c)
-    demonstrate_free_text_representation(c, vocab)
-    demonstrate_inverted_index(c)
-    demonstrate_term_document_matrix(c)
+    # Analyze the corpus once; every representation below reads from this cache
+    analyzed = AnalyzedCorpus(c, use_lucene=True)
+    demonstrate_document_representation(c, analyzed)
+    vocab = demonstrate_controlled_vocabulary(analyzed)
+    demonstrate_free_text_representation(analyzed, vocab)
+    idx = demonstrate_inverted_index(analyzed)
+    demonstrate_boolean_search(idx)
+    demonstrate_bm25(idx)
+    demonstrate_term_document_matrix(analyzed)
 
 
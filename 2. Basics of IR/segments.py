@@ -0,0 +1,536 @@
+import bisect
+import heapq
+import json
+import math
+import os
+import shutil
+import threading
+from array import array
+from itertools import groupby
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+from inverted_index import CollectionStats, InvertedIndex, Posting
+from postings import NO_MORE_DOCS
+from representation import Document
+from text_processing import process_text
+
+# Segment-based index for continuous ingestion, in the spirit of Lucene's IndexWriter:
+#   - new documents go to an in-memory buffer that is flushed as an immutable segment
+#     every max_buffered_docs documents
+#   - deletes only set a bit in the owning segment's deletion bitmap; an update is a
+#     delete followed by an add
+#   - a TieredMergePolicy picks groups of similarly sized segments to merge, and the
+#     merges run on a background thread; postings are merged term by term, dropping
+#     deleted docs
+# Searching goes through reader(), a point-in-time IndexSnapshot that offers the
+# InvertedIndex read API, so BooleanSearcher and BM25Searcher work on it unchanged.
+
+
+def _fsync(path: str):
+    # A directory is synced so that the entries created or renamed in it persist
+    if os.name == "nt" and os.path.isdir(path):
+        return  # Windows cannot open directories; NTFS journals their entries
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def _bit_set(bits: Sequence[int], doc: int) -> bool:
+    i = doc >> 3
+    return i < len(bits) and bool(bits[i] & (1 << (doc & 7)))
+
+
+class Segment:
+    def __init__(self, name: str, index: InvertedIndex, deleted: Optional[bytearray] = None):
+        self.name = name
+        self.index = index
+        self.deleted = deleted if deleted is not None else bytearray()
+        self.num_deleted = sum(bin(b).count("1") for b in self.deleted)
+        self.del_file: Optional[str] = None  # committed deletion bitmap, <name>_<commit>.del
+        self.del_written = self.num_deleted  # num_deleted when del_file was written
+        self.synced = False  # segment files known to be on disk (fsynced by a commit)
+
+    @property
+    def max_doc(self) -> int:
+        return self.index.num_docs
+
+    @property
+    def live_docs(self) -> int:
+        return self.max_doc - self.num_deleted
+
+    def is_deleted(self, doc: int) -> bool:
+        return _bit_set(self.deleted, doc)
+
+    def delete(self, doc: int) -> bool:
+        i = doc >> 3
+        if i >= len(self.deleted):
+            self.deleted.extend(bytes(i + 1 - len(self.deleted)))
+        bit = 1 << (doc & 7)
+        if self.deleted[i] & bit:
+            return False
+        self.deleted[i] |= bit
+        self.num_deleted += 1
+        return True
+
+
+class TieredMergePolicy:
+    """
+    Simplified version of Lucene's TieredMergePolicy (the policy indexer.py configures).
+    Segments are sized by live docs, with small ones rounded up to floor_segment_docs.
+    Each size tier may hold about segments_per_tier segments; beyond that budget the
+    most balanced window of up to max_merge_at_once similarly sized segments is merged.
+    A segment whose deleted share exceeds deletes_pct_allowed is rewritten on its own.
+    """
+
+    def __init__(
+        self,
+        segments_per_tier: int = 10,
+        max_merge_at_once: int = 10,
+        floor_segment_docs: int = 1000,
+        deletes_pct_allowed: float = 33.0,
+    ):
+        self.segments_per_tier = segments_per_tier
+        self.max_merge_at_once = max_merge_at_once
+        self.floor_segment_docs = floor_segment_docs
+        self.deletes_pct_allowed = deletes_pct_allowed
+
+    def _size(self, seg: Segment) -> int:
+        return max(seg.live_docs, self.floor_segment_docs)
+
+    def _allowed_segment_count(self, total: int) -> int:
+        allowed = 0
+        level = float(self.floor_segment_docs)
+        remaining = float(total)
+        while True:
+            count = remaining / level
+            if count < self.segments_per_tier:
+                return allowed + math.ceil(count)
+            allowed += self.segments_per_tier
+            remaining -= self.segments_per_tier * level
+            level *= self.max_merge_at_once
+
+    def find_merge(self, segments: List[Segment]) -> Optional[List[Segment]]:
+        for seg in segments:
+            if seg.max_doc and 100.0 * seg.num_deleted / seg.max_doc > self.deletes_pct_allowed:
+                return [seg]
+        if len(segments) < 2:
+            return None
+        ordered = sorted(segments, key=self._size)
+        if len(segments) <= self._allowed_segment_count(sum(self._size(s) for s in ordered)):
+            return None
+        width = min(self.max_merge_at_once, len(ordered))
+        best, best_score = None, None
+        for start in range(len(ordered) - width + 1):
+            window = ordered[start : start + width]
+            sizes = [self._size(s) for s in window]
+            merged = sum(sizes)
+            # Low skew means similarly sized segments; the small size term favours cheap merges
+            score = (max(sizes) / merged) * merged ** 0.05
+            if best_score is None or score < best_score:
+                best, best_score = window, score
+        return best
+
+
+def _merged_terms(indexes: List[InvertedIndex]) -> Iterator[str]:
+    # Union of the indexes' sorted dictionaries, in order, without materializing it
+    merged = heapq.merge(*(index.term_dictionary() for index in indexes))
+    return (term for term, _ in groupby(merged))
+
+
+def merge_segments(segments: List[Segment], deleted: List[bytes]) -> Tuple[InvertedIndex, List[array]]:
+    """
+    Merge `segments` into one InvertedIndex, skipping docs set in the matching
+    `deleted` bitmaps. Returns the index and, per source segment, an old -> new doc
+    number map (-1 for dropped docs).
+    """
+    merged = InvertedIndex()
+    remaps: List[array] = []
+    for seg, bits in zip(segments, deleted):
+        remap = array("l", [-1]) * seg.max_doc
+        doc_ids, doc_lengths = seg.index.doc_ids, seg.index.doc_lengths
+        for d in range(seg.max_doc):
+            if not _bit_set(bits, d):
+                remap[d] = merged._add_doc(doc_ids[d], doc_lengths[d])
+        remaps.append(remap)
+    for term in _merged_terms([seg.index for seg in segments]):
+        for seg, remap in zip(segments, remaps):
+            for d, pos_list in seg.index.positional_postings(term):
+                if remap[d] >= 0:
+                    merged._add_posting(term, remap[d], pos_list)
+    return merged, remaps
+
+
+class _Concat:
+    # Read-only concatenation of per-segment sequences (doc_ids, doc_lengths)
+    def __init__(self, parts: list, bases: List[int], total: int):
+        self._parts = parts
+        self._bases = bases
+        self._total = total
+
+    def __len__(self) -> int:
+        return self._total
+
+    def __getitem__(self, doc: int):
+        i = bisect.bisect_right(self._bases, doc) - 1
+        return self._parts[i][doc - self._bases[i]]
+
+    def __iter__(self):
+        for part in self._parts:
+            yield from part
+
+
+class _MultiCursor:
+    # PostingsCursor protocol over several segments' cursors, skipping deleted docs
+    def __init__(self, parts: List[Tuple[int, int, object, bytes]], df: int):
+        self.parts = parts  # (doc base, end, cursor, deletion bitmap)
+        self.df = df
+        self.cost = df
+        self.doc = -1
+        self.tf = 0
+        self._i = 0
+
+    def next_doc(self) -> int:
+        return self.advance(self.doc + 1)
+
+    def advance(self, target: int) -> int:
+        if self.doc >= target:
+            return self.doc
+        while self._i < len(self.parts):
+            base, end, cursor, bits = self.parts[self._i]
+            if target < end:
+                d = cursor.advance(max(target - base, 0))
+                while d != NO_MORE_DOCS and _bit_set(bits, d):
+                    d = cursor.next_doc()
+                if d != NO_MORE_DOCS:
+                    self.doc = base + d
+                    self.tf = cursor.tf
+                    return self.doc
+            self._i += 1
+        self.doc = NO_MORE_DOCS
+        self.tf = 0
+        return self.doc
+
+    def doc_positions(self) -> List[int]:
+        return self.parts[self._i][2].doc_positions()
+
+
+class IndexSnapshot:
+    """Point-in-time, read-only view over a list of segments; doc numbers are global."""
+
+    has_deletions = True
+
+    def __init__(self, segments: List[Segment]):
+        self._indexes = [seg.index for seg in segments]
+        self._deleted = [bytes(seg.deleted) for seg in segments]
+        self._bases: List[int] = []
+        total = 0
+        for index in self._indexes:
+            self._bases.append(total)
+            total += index.num_docs
+        self.num_docs = total
+        self.num_live_docs = total - sum(seg.num_deleted for seg in segments)
+        self.doc_ids = _Concat([index.doc_ids for index in self._indexes], self._bases, total)
+        self.doc_lengths = _Concat([index.doc_lengths for index in self._indexes], self._bases, total)
+        # Like Lucene, statistics count deleted docs until a merge drops them
+        self.total_tokens = sum(index.total_tokens for index in self._indexes)
+        self.min_doc_length = min((index.min_doc_length for index in self._indexes if index.num_docs), default=0)
+
+    def is_deleted(self, doc: int) -> bool:
+        i = bisect.bisect_right(self._bases, doc) - 1
+        return _bit_set(self._deleted[i], doc - self._bases[i])
+
+    def cursor(self, term: str) -> Optional[_MultiCursor]:
+        parts = []
+        df = 0
+        for base, index, bits in zip(self._bases, self._indexes, self._deleted):
+            cursor = index.cursor(term)
+            if cursor is not None:
+                parts.append((base, base + index.num_docs, cursor, bits))
+                df += cursor.df
+        return _MultiCursor(parts, df) if parts else None
+
+    def df(self, term: str) -> int:
+        return sum(index.df(term) for index in self._indexes)
+
+    def cf(self, term: str) -> int:
+        return sum(index.cf(term) for index in self._indexes)
+
+    def term_max_tf(self, term: str) -> int:
+        return max((index.term_max_tf(term) for index in self._indexes), default=0)
+
+    def stats(self) -> CollectionStats:
+        return CollectionStats(self.num_docs, self.total_tokens, self.min_doc_length, self.df, self.cf)
+
+    def postings(self, term: str) -> List[Posting]:
+        cursor = self.cursor(term)
+        result: List[Posting] = []
+        if cursor is None:
+            return result
+        while cursor.next_doc() != NO_MORE_DOCS:
+            result.append((self.doc_ids[cursor.doc], cursor.doc_positions()))
+        return result
+
+    def vocabulary(self) -> List[str]:
+        return list(_merged_terms(self._indexes))
+
+    def expand_terms(self, pattern: str) -> List[str]:
+        return sorted(set().union(*(index.expand_terms(pattern) for index in self._indexes)))
+
+
+class SegmentedIndex:
+    """
+    Index that accepts adds, deletes and updates while staying searchable. With
+    `path`, flushed segments are written with InvertedIndex.save() and reopened
+    memory-mapped, and commit() records the segment list and deletion bitmaps in
+    segments.json so the index can be reopened later.
+
+    Like Lucene's live-docs generations, a commit never overwrites a file the
+    previous commit refers to: changed deletion bitmaps go to new
+    <segment>_<commit>.del files, segments.json (naming them) is swapped in with
+    os.replace, and only then are the files of the previous commit removed. Every
+    file the new commit refers to, and the directory, is fsynced before the swap.
+    """
+
+    def __init__(
+        self,
+        path: Optional[str] = None,
+        max_buffered_docs: int = 1000,
+        merge_policy: Optional[TieredMergePolicy] = None,
+        background_merges: bool = True,
+        use_lucene: bool = True,
+    ):
+        self.path = path
+        self.max_buffered_docs = max_buffered_docs
+        self.merge_policy = merge_policy if merge_policy is not None else TieredMergePolicy()
+        self.use_lucene = use_lucene
+        self.segments: List[Segment] = []
+        self._buffer: Optional[Segment] = None
+        self._live: Dict[str, Tuple[Segment, int]] = {}  # doc_id -> (segment, doc number)
+        self._merging: set = set()
+        self._obsolete: List[Segment] = []  # merged away; files removed by the next commit
+        self._generation = 0
+        self._commit_gen = 0
+        self._lock = threading.RLock()
+        self._executor = ThreadPoolExecutor(max_workers=1) if background_merges else None
+        self._pending: List[Future] = []
+        if path is not None:
+            os.makedirs(path, exist_ok=True)
+            if os.path.exists(os.path.join(path, "segments.json")):
+                self._load()
+
+    def __len__(self) -> int:
+        return len(self._live)
+
+    def __contains__(self, doc_id: str) -> bool:
+        return doc_id in self._live
+
+    def _next_name(self) -> str:
+        self._generation += 1
+        return f"_{self._generation}"
+
+    def add_document(self, doc: Document):
+        self.add_tokens(doc.doc_id, process_text(doc.text, use_lucene=self.use_lucene))
+
+    def add_tokens(self, doc_id: str, tokens: List[str]):
+        with self._lock:
+            if doc_id in self._live:
+                raise ValueError(f"Document {doc_id!r} already exists; use update_document")
+            if self._buffer is None:
+                self._buffer = Segment(self._next_name(), InvertedIndex())
+            buffer = self._buffer
+            self._live[doc_id] = (buffer, buffer.max_doc)
+            buffer.index.add_tokens(doc_id, tokens)
+            full = buffer.max_doc >= self.max_buffered_docs
+        if full:
+            self.flush()
+
+    def delete_document(self, doc_id: str) -> bool:
+        with self._lock:
+            entry = self._live.pop(doc_id, None)
+            if entry is None:
+                return False
+            seg, doc = entry
+            return seg.delete(doc)
+
+    def update_document(self, doc: Document):
+        tokens = process_text(doc.text, use_lucene=self.use_lucene)
+        with self._lock:
+            self.delete_document(doc.doc_id)
+            self.add_tokens(doc.doc_id, tokens)
+
+    def flush(self):
+        with self._lock:
+            seg = self._buffer
+            if seg is None:
+                return
+            self._buffer = None
+            if self.path is not None:
+                seg_path = os.path.join(self.path, seg.name)
+                seg.index.save(seg_path)
+                seg.index = InvertedIndex.open(seg_path)
+            self.segments.append(seg)
+        self.maybe_merge()
+
+    def maybe_merge(self):
+        with self._lock:
+            eligible = [s for s in self.segments if s.name not in self._merging]
+            merge = self.merge_policy.find_merge(eligible)
+            if merge is None:
+                return
+            self._merging.update(s.name for s in merge)
+            deleted = [bytes(s.deleted) for s in merge]
+            name = self._next_name()
+        if self._executor is not None:
+            self._pending.append(self._executor.submit(self._run_merge, merge, deleted, name))
+        else:
+            self._run_merge(merge, deleted, name)
+
+    def _run_merge(self, merge: List[Segment], deleted: List[bytes], name: str):
+        try:
+            index, remaps = merge_segments(merge, deleted)
+            if self.path is not None:
+                seg_path = os.path.join(self.path, name)
+                index.save(seg_path)
+                index = InvertedIndex.open(seg_path)
+            merged = Segment(name, index)
+            with self._lock:
+                for src, remap in zip(merge, remaps):
+                    doc_ids = src.index.doc_ids
+                    for d, new_doc in enumerate(remap):
+                        if new_doc < 0:
+                            continue
+                        if src.is_deleted(d):
+                            # deleted while the merge was running
+                            merged.delete(new_doc)
+                        else:
+                            self._live[doc_ids[d]] = (merged, new_doc)
+                self.segments = [s for s in self.segments if s not in merge]
+                if merged.live_docs:
+                    self.segments.append(merged)
+                else:
+                    self._obsolete.append(merged)  # every doc was deleted: nothing to keep
+                self._obsolete.extend(merge)
+        finally:
+            # A failed merge leaves its sources in place and eligible again
+            with self._lock:
+                self._merging.difference_update(s.name for s in merge)
+        self.maybe_merge()
+
+    def wait_for_merges(self):
+        while self._pending:
+            self._pending.pop(0).result()
+
+    def force_merge(self):
+        # Merge everything down to a single segment (like IndexWriter.forceMerge(1))
+        self.flush()
+        self.wait_for_merges()
+        with self._lock:
+            merge = list(self.segments)
+            if len(merge) < 2 and not any(s.num_deleted for s in merge):
+                return
+            self._merging.update(s.name for s in merge)
+            deleted = [bytes(s.deleted) for s in merge]
+            name = self._next_name()
+        self._run_merge(merge, deleted, name)
+        self.wait_for_merges()
+
+    def reader(self) -> IndexSnapshot:
+        # Like an NRT reopen: buffered docs are flushed so the snapshot sees them
+        self.flush()
+        with self._lock:
+            return IndexSnapshot(list(self.segments))
+
+    def commit(self):
+        self.flush()
+        if self.path is None:
+            return
+        with self._lock:
+            self._commit_gen += 1
+            written: List[Tuple[Segment, str]] = []
+            for seg in self.segments:
+                if seg.num_deleted != seg.del_written:
+                    del_file = f"{seg.name}_{self._commit_gen}.del"
+                    with open(os.path.join(self.path, del_file), "wb") as f:
+                        f.write(seg.deleted)
+                        f.flush()
+                        os.fsync(f.fileno())
+                    written.append((seg, del_file))
+            new_files = {seg.name: del_file for seg, del_file in written}
+            state = {
+                "generation": self._generation,
+                "commit": self._commit_gen,
+                "segments": [
+                    {"name": s.name, "max_doc": s.max_doc, "del": new_files.get(s.name, s.del_file)}
+                    for s in self.segments
+                ],
+            }
+            # Segments flushed or merged since the last commit were written without
+            # fsync; they must be on disk before segments.json may name them
+            new_segments = [seg for seg in self.segments if not seg.synced]
+            for seg in new_segments:
+                seg_path = os.path.join(self.path, seg.name)
+                for file_name in os.listdir(seg_path):
+                    _fsync(os.path.join(seg_path, file_name))
+                _fsync(seg_path)
+            tmp = os.path.join(self.path, "segments.json.tmp")
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(state, f, indent=2)
+                f.flush()
+                os.fsync(f.fileno())
+            _fsync(self.path)  # the new segment directories, .del files and tmp
+            os.replace(tmp, os.path.join(self.path, "segments.json"))
+            _fsync(self.path)  # the rename itself
+            for seg in new_segments:
+                seg.synced = True
+            # From here on only the new commit is referenced: drop the bitmaps it
+            # replaced and the merged-away segments. Open snapshots keep their mmaps
+            # valid on POSIX after the files are unlinked.
+            stale = [seg.del_file for seg, _ in written if seg.del_file is not None]
+            for seg, del_file in written:
+                seg.del_file = del_file
+                seg.del_written = seg.num_deleted
+            for seg in self._obsolete:
+                shutil.rmtree(os.path.join(self.path, seg.name), ignore_errors=True)
+                if seg.del_file is not None:
+                    stale.append(seg.del_file)
+            for del_file in stale:
+                try:
+                    os.remove(os.path.join(self.path, del_file))
+                except FileNotFoundError:
+                    pass
+            self._obsolete = []
+
+    def _load(self):
+        with open(os.path.join(self.path, "segments.json"), encoding="utf-8") as f:
+            state = json.load(f)
+        self._generation = state["generation"]
+        self._commit_gen = state["commit"]
+        for info in state["segments"]:
+            name = info["name"]
+            del_file = info["del"]
+            deleted = bytearray()
+            if del_file is not None:
+                with open(os.path.join(self.path, del_file), "rb") as f:
+                    deleted = bytearray(f.read())
+            seg = Segment(name, InvertedIndex.open(os.path.join(self.path, name)), deleted)
+            seg.del_file = del_file
+            seg.synced = True
+            for d, doc_id in enumerate(seg.index.doc_ids):
+                if not seg.is_deleted(d):
+                    self._live[doc_id] = (seg, d)
+            self.segments.append(seg)
+
+    def close(self):
+        self.wait_for_merges()
+        self.commit()
+        if self._executor is not None:
+            self._executor.shutdown()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,147 @@
+import heapq
+import json
+import os
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from bm25 import BM25Searcher
+from inverted_index import CollectionStats, InvertedIndex
+from representation import DiskCorpus, Document
+from spimi import SpimiIndexer
+from text_processing import pool_context, process_text
+
+# Document-partitioned sharding with scatter-gather BM25 search.
+#
+# build_shards() routes every document to a shard by a stable hash of its doc_id,
+# spooling each shard's documents to JSONL, and then builds the shards in parallel
+# worker processes (SpimiIndexer, so each build stays within its memory budget).
+# shards.json records the collection-wide N, total tokens and shortest doc.
+#
+# ShardedSearcher keeps a process pool in which every worker opens all shards
+# memory-mapped. A query is analyzed once, fanned out to one task per shard, and
+# the per-shard top-k lists are merged into the global top-k. Each shard scores
+# with collection-wide statistics (N and avgdl from shards.json, df summed over
+# all shards' term dictionaries), so scores are comparable across shards and equal
+# to those of a single index over the whole collection.
+
+
+def shard_of(doc_id: str, num_shards: int) -> int:
+    return zlib.crc32(doc_id.encode("utf-8")) % num_shards
+
+
+def _shard_path(path: str, shard: int) -> str:
+    return os.path.join(path, f"shard_{shard:03d}")
+
+
+def _build_shard(spool: str, out: str, use_lucene: bool, memory_budget_mb: float) -> Tuple[int, int, int]:
+    indexer = SpimiIndexer(out, memory_budget_mb=memory_budget_mb, use_lucene=use_lucene)
+    indexer.build(DiskCorpus(spool))
+    with indexer.finish() as index:
+        return index.num_docs, index.total_tokens, index.min_doc_length
+
+
+def build_shards(
+    documents: Iterable[Document],
+    path: str,
+    num_shards: int,
+    workers: Optional[int] = None,
+    use_lucene: bool = True,
+    memory_budget_mb: float = 64,
+) -> dict:
+    os.makedirs(path, exist_ok=True)
+    spools = [os.path.join(path, f"shard_{i:03d}.jsonl") for i in range(num_shards)]
+    outs = [open(p, "w", encoding="utf-8") for p in spools]
+    try:
+        for doc in documents:
+            record = {"doc_id": doc.doc_id, "title": doc.title, "text": doc.text}
+            outs[shard_of(doc.doc_id, num_shards)].write(json.dumps(record) + "\n")
+    finally:
+        for f in outs:
+            f.close()
+    with ProcessPoolExecutor(max_workers=workers or num_shards, mp_context=pool_context(use_lucene)) as pool:
+        futures = [
+            pool.submit(_build_shard, spools[i], _shard_path(path, i), use_lucene, memory_budget_mb)
+            for i in range(num_shards)
+        ]
+        stats = [f.result() for f in futures]
+    for p in spools:
+        os.remove(p)
+    num_docs = sum(s[0] for s in stats)
+    non_empty = [s[2] for s in stats if s[0]]
+    manifest = {
+        "num_shards": num_shards,
+        "use_lucene": use_lucene,
+        "num_docs": num_docs,
+        "total_tokens": sum(s[1] for s in stats),
+        "min_doc_length": min(non_empty) if non_empty else 0,
+    }
+    with open(os.path.join(path, "shards.json"), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+    return manifest
+
+
+# Per-worker state, set up once by _init_worker
+_WORKER: Dict[str, object] = {}
+
+
+def _init_worker(path: str, k1: float, b: float):
+    with open(os.path.join(path, "shards.json"), encoding="utf-8") as f:
+        manifest = json.load(f)
+    indexes = [InvertedIndex.open(_shard_path(path, i)) for i in range(manifest["num_shards"])]
+    stats = CollectionStats(
+        manifest["num_docs"],
+        manifest["total_tokens"],
+        manifest["min_doc_length"],
+        df=lambda term: sum(index.df(term) for index in indexes),
+        cf=lambda term: sum(index.cf(term) for index in indexes),
+    )
+    _WORKER["searchers"] = [BM25Searcher(index, k1=k1, b=b, stats=stats) for index in indexes]
+
+
+def _search_shard(shard: int, terms: List[str], k: int) -> List[Tuple[str, float]]:
+    return _WORKER["searchers"][shard].search_terms(terms, k=k)
+
+
+class ShardedSearcher:
+    def __init__(self, path: str, workers: Optional[int] = None, k1: float = 1.2, b: float = 0.75):
+        with open(os.path.join(path, "shards.json"), encoding="utf-8") as f:
+            self.manifest = json.load(f)
+        self.num_shards = self.manifest["num_shards"]
+        self.use_lucene = self.manifest["use_lucene"]
+        # Queries are analyzed here, so workers never need a JVM
+        self._pool = ProcessPoolExecutor(
+            max_workers=workers or self.num_shards,
+            mp_context=pool_context(self.use_lucene),
+            initializer=_init_worker,
+            initargs=(path, k1, b),
+        )
+
+    def _gather(self, futures, k: int) -> List[Tuple[str, float]]:
+        # Ties resolve by shard then rank, so results are deterministic
+        hits = []
+        for shard, future in enumerate(futures):
+            for rank, (doc_id, score) in enumerate(future.result()):
+                hits.append((-score, shard, rank, doc_id))
+        return [(doc_id, -neg) for neg, _shard, _rank, doc_id in heapq.nsmallest(k, hits)]
+
+    def _scatter(self, query: str, k: int):
+        terms = process_text(query, use_lucene=self.use_lucene)
+        return [self._pool.submit(_search_shard, shard, terms, k) for shard in range(self.num_shards)]
+
+    def search(self, query: str, k: int = 10) -> List[Tuple[str, float]]:
+        return self._gather(self._scatter(query, k), k)
+
+    def search_many(self, queries: Iterable[str], k: int = 10) -> List[List[Tuple[str, float]]]:
+        # All queries are in flight at once, so shard tasks of different queries overlap
+        pending = [self._scatter(q, k) for q in queries]
+        return [self._gather(futures, k) for futures in pending]
+
+    def close(self):
+        self._pool.shutdown()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
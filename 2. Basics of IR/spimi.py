@@ -0,0 +1,160 @@
+import heapq
+import itertools
+import os
+import shutil
+import struct
+import tempfile
+from array import array
+from typing import BinaryIO, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from index_store import MappedStrings, StringsWriter
+from inverted_index import InvertedIndex, MappedInvertedIndex, TermEntry, write_index
+from postings import PostingsWriter, decode_postings
+from representation import Document, analyze_documents
+from text_processing import process_text
+
+# Single-pass in-memory indexing (SPIMI) for collections larger than RAM.
+#
+# Documents get global doc numbers as they arrive and their postings go straight
+# into a term -> PostingsWriter dictionary. When the estimated size of that
+# dictionary passes the memory budget it is written out as a run (terms in sorted
+# order) and cleared. finish() streams all runs through a k-way heap merge into the
+# InvertedIndex.save() format, so only one term's postings are in memory at a time.
+#
+# Run file records: <I term length> term <IIII df, max tf, docs length,
+# positions length> docs positions. Run lists are gap encoded from doc 0, so
+# decoding yields global doc numbers.
+
+_RECORD_HEADER = struct.Struct("<IIII")
+_TERM_LENGTH = struct.Struct("<I")
+# Rough per-term cost of a dict slot, the key string and a PostingsWriter
+_TERM_OVERHEAD = 400
+
+
+def _write_run(path: str, postings: Dict[str, PostingsWriter]):
+    with open(path, "wb") as f:
+        for term in sorted(postings):
+            w = postings[term]
+            data = term.encode("utf-8")
+            f.write(_TERM_LENGTH.pack(len(data)))
+            f.write(data)
+            f.write(_RECORD_HEADER.pack(w.df, w.max_tf, len(w.docs), len(w.positions)))
+            f.write(w.docs)
+            f.write(w.positions)
+
+
+def _read_exact(f: BinaryIO, n: int) -> bytes:
+    data = f.read(n)
+    if len(data) != n:
+        raise ValueError(f"Truncated run file: {f.name}")
+    return data
+
+
+def _read_run(path: str) -> Iterator[Tuple[str, bytes, bytes]]:
+    with open(path, "rb", buffering=1 << 20) as f:
+        while True:
+            head = f.read(_TERM_LENGTH.size)
+            if not head:
+                return
+            term = _read_exact(f, _TERM_LENGTH.unpack(head)[0]).decode("utf-8")
+            _df, _max_tf, docs_len, pos_len = _RECORD_HEADER.unpack(_read_exact(f, _RECORD_HEADER.size))
+            yield term, _read_exact(f, docs_len), _read_exact(f, pos_len)
+
+
+def _merge_runs(paths: List[str]) -> Iterator[Tuple[str, TermEntry]]:
+    # heapq.merge is stable, so a term's parts arrive in run (= doc number) order
+    merged = heapq.merge(*(_read_run(p) for p in paths), key=lambda rec: rec[0])
+    for term, parts in itertools.groupby(merged, key=lambda rec: rec[0]):
+        writer = PostingsWriter()
+        for _term, docs, positions in parts:
+            for doc, pos_list in decode_postings(docs, positions):
+                writer.add(doc, pos_list)
+        yield term, TermEntry(writer.df, writer.max_tf, writer.cf, writer.docs, writer.positions, writer.skips)
+
+
+def _read_lengths(path: str) -> Iterator[int]:
+    with open(path, "rb") as f:
+        while True:
+            chunk = array("I")
+            data = f.read(4 * 65536)
+            if not data:
+                return
+            chunk.frombytes(data)
+            yield from chunk
+
+
+class SpimiIndexer:
+    def __init__(
+        self,
+        path: str,
+        memory_budget_mb: float = 64,
+        use_lucene: bool = True,
+        tmp_dir: Optional[str] = None,
+    ):
+        self.path = path
+        self.memory_budget = int(memory_budget_mb * 1024 * 1024)
+        self.use_lucene = use_lucene
+        self.num_docs = 0
+        self.runs: List[str] = []
+        self._tmp = tempfile.mkdtemp(prefix="spimi-", dir=tmp_dir)
+        self._doc_ids = StringsWriter(os.path.join(self._tmp, "docids.txt"))
+        self._doc_lengths = open(os.path.join(self._tmp, "doclens.bin"), "wb")
+        self._lengths = array("I")
+        self._postings: Dict[str, PostingsWriter] = {}
+        self._estimated_bytes = 0
+
+    def add_document(self, doc: Document):
+        self.add_tokens(doc.doc_id, process_text(doc.text, use_lucene=self.use_lucene))
+
+    def add_tokens(self, doc_id: str, tokens: List[str]):
+        doc_num = self.num_docs
+        self.num_docs += 1
+        self._doc_ids.write(doc_id)
+        self._lengths.append(len(tokens))
+        positions: Dict[str, List[int]] = {}
+        for pos, token in enumerate(tokens):
+            positions.setdefault(token, []).append(pos)
+        postings = self._postings
+        for term, pos_list in positions.items():
+            writer = postings.get(term)
+            if writer is None:
+                writer = postings[term] = PostingsWriter(with_skips=False)
+                self._estimated_bytes += _TERM_OVERHEAD
+            writer.add(doc_num, pos_list)
+        # vbyte gaps are mostly one byte: ~2 per posting plus ~1 per position
+        self._estimated_bytes += 2 * len(positions) + len(tokens)
+        if self._estimated_bytes >= self.memory_budget:
+            self.flush_run()
+
+    def build(self, documents: Iterable[Document], workers: int = 1):
+        for doc, tokens in analyze_documents(documents, use_lucene=self.use_lucene, workers=workers):
+            self.add_tokens(doc.doc_id, tokens)
+
+    def flush_run(self):
+        self._lengths.tofile(self._doc_lengths)
+        self._lengths = array("I")
+        if not self._postings:
+            return
+        path = os.path.join(self._tmp, f"run-{len(self.runs):05d}.bin")
+        _write_run(path, self._postings)
+        self.runs.append(path)
+        self._postings = {}
+        self._estimated_bytes = 0
+
+    def finish(self) -> MappedInvertedIndex:
+        """Merge all runs into `path` and return the index opened from disk."""
+        self.flush_run()
+        self._doc_ids.close()
+        self._doc_lengths.close()
+        doc_ids = MappedStrings(os.path.join(self._tmp, "docids.txt"))
+        try:
+            write_index(
+                self.path,
+                _merge_runs(self.runs),
+                iter(doc_ids),
+                _read_lengths(os.path.join(self._tmp, "doclens.bin")),
+            )
+        finally:
+            doc_ids.close()
+            shutil.rmtree(self._tmp, ignore_errors=True)
+        return InvertedIndex.open(self.path)
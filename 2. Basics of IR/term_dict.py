@@ -0,0 +1,254 @@
+import re
+from array import array
+from typing import Iterable, Iterator, List, Optional, Sequence, Tuple
+
+from index_store import MappedFile
+from postings import vbyte_decode, vbyte_encode
+
+# Sorted term dictionary with front coding.
+# Terms are stored in blocks of BLOCK_SIZE as UTF-8 bytes (byte order matches str
+# order). The first term of a block is stored whole, every other term as
+#   vbyte(length of prefix shared with the previous term), vbyte(suffix length), suffix
+# and only the block start offsets are kept as integers. A lookup binary-searches the
+# block heads and decodes at most one block.
+#
+# PermutermIndex answers wildcard patterns: every rotation of term + END goes into a
+# second front-coded dictionary, and X*Y becomes a prefix lookup of Y + END + X.
+
+BLOCK_SIZE = 16
+END = "\x00"  # the textbook '$'; sorts before every character a term can contain
+
+
+class _FrontCoder:
+    def __init__(self, block_size: int):
+        self.block_size = block_size
+        self.count = 0
+        self._prev: Optional[bytes] = None
+
+    def encode(self, term: str) -> Tuple[bool, bytearray]:
+        # (starts a new block, encoded entry)
+        data = term.encode("utf-8")
+        if self._prev is not None and data <= self._prev:
+            raise ValueError(f"Terms must be unique and sorted; got {term!r} after {self._prev.decode('utf-8')!r}")
+        out = bytearray()
+        head = self.count % self.block_size == 0
+        if head:
+            vbyte_encode(len(data), out)
+            out += data
+        else:
+            prev = self._prev
+            shared = 0
+            limit = min(len(prev), len(data))
+            while shared < limit and prev[shared] == data[shared]:
+                shared += 1
+            vbyte_encode(shared, out)
+            vbyte_encode(len(data) - shared, out)
+            out += data[shared:]
+        self._prev = data
+        self.count += 1
+        return head, out
+
+
+class TermDictWriter:
+    """
+    Streams sorted terms to `path` as front-coded blocks, plus `<path>.idx` holding
+    array('Q') of [block size, term count, block offsets..., end offset].
+    """
+
+    def __init__(self, path: str, block_size: int = BLOCK_SIZE):
+        self._data = open(path, "wb")
+        self._index = open(path + ".idx", "wb")
+        self._coder = _FrontCoder(block_size)
+        self._offset = 0
+        array("Q", (block_size, 0)).tofile(self._index)  # count is patched in close()
+
+    @property
+    def count(self) -> int:
+        return self._coder.count
+
+    def write(self, term: str):
+        head, entry = self._coder.encode(term)
+        if head:
+            array("Q", [self._offset]).tofile(self._index)
+        self._data.write(entry)
+        self._offset += len(entry)
+
+    def close(self):
+        array("Q", [self._offset]).tofile(self._index)
+        self._index.seek(array("Q").itemsize)
+        array("Q", [self.count]).tofile(self._index)
+        self._data.close()
+        self._index.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class TermDictionary:
+    """
+    Read-only sorted sequence of terms over front-coded blocks, either built in
+    memory with from_sorted() or memory-mapped with open(). Term i is the i-th term
+    in sorted order, so ordinals double as indexes into per-term arrays.
+    """
+
+    def __init__(self, data, blocks: Sequence[int], count: int, block_size: int = BLOCK_SIZE):
+        self._data = data
+        self._blocks = blocks  # block start offsets, then the end offset
+        self._count = count
+        self.block_size = block_size
+        self._files: List[MappedFile] = []
+
+    @classmethod
+    def from_sorted(cls, terms: Iterable[str], block_size: int = BLOCK_SIZE) -> "TermDictionary":
+        coder = _FrontCoder(block_size)
+        data = bytearray()
+        blocks = array("Q")
+        for term in terms:
+            head, entry = coder.encode(term)
+            if head:
+                blocks.append(len(data))
+            data += entry
+        blocks.append(len(data))
+        return cls(data, blocks, coder.count, block_size)
+
+    @classmethod
+    def open(cls, path: str) -> "TermDictionary":
+        data_file, index_file = MappedFile(path), MappedFile(path + ".idx")
+        index = index_file.view("Q")
+        terms = cls(data_file.view(), index[2:], index[1], index[0])
+        terms._files = [data_file, index_file]
+        return terms
+
+    def __len__(self) -> int:
+        return self._count
+
+    def nbytes(self) -> int:
+        return len(self._data) + len(self._blocks) * 8
+
+    def _head(self, block: int) -> bytes:
+        n, pos = vbyte_decode(self._data, self._blocks[block])
+        return bytes(self._data[pos : pos + n])
+
+    def _scan(self, block: int) -> Iterator[bytes]:
+        data = self._data
+        pos, end = self._blocks[block], self._blocks[block + 1]
+        n, pos = vbyte_decode(data, pos)
+        term = bytes(data[pos : pos + n])
+        pos += n
+        yield term
+        while pos < end:
+            shared, pos = vbyte_decode(data, pos)
+            n, pos = vbyte_decode(data, pos)
+            term = term[:shared] + bytes(data[pos : pos + n])
+            pos += n
+            yield term
+
+    def _bisect(self, key: bytes) -> int:
+        # Ordinal of the first term >= key
+        lo, hi = 0, len(self._blocks) - 1
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._head(mid) <= key:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo == 0:
+            return 0
+        block = lo - 1
+        for j, term in enumerate(self._scan(block)):
+            if term >= key:
+                return block * self.block_size + j
+        return min(lo * self.block_size, self._count)
+
+    def bisect_left(self, term: str) -> int:
+        return self._bisect(term.encode("utf-8"))
+
+    def find(self, term: str) -> int:
+        key = term.encode("utf-8")
+        i = self._bisect(key)
+        if i < self._count:
+            for j, t in enumerate(self._scan(i // self.block_size)):
+                if j == i % self.block_size:
+                    return i if t == key else -1
+        return -1
+
+    def __getitem__(self, i: int) -> str:
+        if i < 0:
+            i += self._count
+        if not 0 <= i < self._count:
+            raise IndexError(i)
+        for j, term in enumerate(self._scan(i // self.block_size)):
+            if j == i % self.block_size:
+                return term.decode("utf-8")
+
+    def iter_range(self, start: int = 0, stop: Optional[int] = None) -> Iterator[Tuple[int, str]]:
+        # Cursor over (ordinal, term) for ordinals in [start, stop), decoding each block once
+        stop = self._count if stop is None else min(stop, self._count)
+        i = max(start, 0)
+        while i < stop:
+            block = i // self.block_size
+            for j, term in enumerate(self._scan(block)):
+                ordinal = block * self.block_size + j
+                if ordinal >= stop:
+                    return
+                if ordinal >= i:
+                    yield ordinal, term.decode("utf-8")
+            i = (block + 1) * self.block_size
+
+    def __iter__(self) -> Iterator[str]:
+        return (term for _, term in self.iter_range())
+
+    def prefix_range(self, prefix: str) -> Tuple[int, int]:
+        key = prefix.encode("utf-8")
+        lo = self._bisect(key)
+        # Smallest byte string above every string starting with key
+        upper = key.rstrip(b"\xff")
+        if not upper:
+            return lo, self._count
+        return lo, self._bisect(upper[:-1] + bytes([upper[-1] + 1]))
+
+    def with_prefix(self, prefix: str) -> Iterator[str]:
+        lo, hi = self.prefix_range(prefix)
+        return (term for _, term in self.iter_range(lo, hi))
+
+    def close(self):
+        if self._files:
+            self._blocks.release()  # a slice of the mapped index, not tracked by MappedFile
+        for f in self._files:
+            f.close()
+        self._files = []
+
+
+class PermutermIndex:
+    """
+    Wildcard lookup over a TermDictionary. Built once from the dictionary; patterns
+    use '*' for any run of characters.
+    """
+
+    def __init__(self, terms: TermDictionary, block_size: int = BLOCK_SIZE):
+        self.terms = terms
+        rotations = []
+        for i, term in enumerate(terms):
+            t = term + END
+            rotations.extend((t[j:] + t[:j], i) for j in range(len(t)))
+        rotations.sort()
+        self._rotations = TermDictionary.from_sorted((r for r, _ in rotations), block_size)
+        self._term_nums = array("I", (i for _, i in rotations))
+
+    def nbytes(self) -> int:
+        return self._rotations.nbytes() + len(self._term_nums) * self._term_nums.itemsize
+
+    def lookup(self, pattern: str) -> List[str]:
+        parts = pattern.split("*")
+        if len(parts) == 1:
+            return [pattern] if self.terms.find(pattern) >= 0 else []
+        # X*...*Y: every match starts with X and ends with Y, i.e. has a rotation Y$X...
+        lo, hi = self._rotations.prefix_range(parts[-1] + END + parts[0])
+        matches = [self.terms[n] for n in sorted(set(self._term_nums[lo:hi]))]
+        if len(parts) > 2:
+            regex = re.compile(".*".join(map(re.escape, parts)), re.DOTALL)
+            matches = [t for t in matches if regex.fullmatch(t)]
+        return matches
@@ -1,5 +1,10 @@
+import multiprocessing
 import re
-from typing import Iterable, List
+import threading
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from typing import Dict, Iterable, Iterator, List, Tuple
 
 try:
     
@@ -18,31 +23,73 @@ _DEFAULT_STOPWORDS = {
 }
 
 
+_STEM_SUFFIXES = ("ing", "edly", "edly", "ed", "ly", "ies", "es", "s")
+_IRREGULAR_LEMMAS = {"mice": "mouse", "men": "man", "children": "child", "geese": "goose"}
+
+# Separators, punctuation and whitespace all collapse to a single space
+_NON_ALNUM_RE = re.compile(r"[^a-z0-9]+")
+
+
 def normalize_text(text: str) -> str:
-    text = text.lower()
-    text = re.sub(r"[\-_/]", " ", text)
-    text = re.sub(r"[^a-z0-9\s]", " ", text)
-    text = re.sub(r"\s+", " ", text).strip()
-    return text
+    return _NON_ALNUM_RE.sub(" ", text.lower()).strip()
 
 
-def tokenize(text: str, use_lucene: bool = True) -> List[str]:
-    if use_lucene and _HAS_LUCENE:
-        if not lucene.getVMEnv():
-            lucene.initVM(vmargs=["-Djava.awt.headless=true"])
+_TOKEN_RE = re.compile(r"[a-zA-Z0-9]+")
+
+# One EnglishAnalyzer per thread: the JVM attach and analyzer construction are
+# paid once, and Lucene's reuse strategy hands back the same token stream on
+# every subsequent tokenStream() call from that thread.
+_local = threading.local()
+
+
+def _attach_jvm():
+    env = lucene.getVMEnv()
+    if not env:
+        lucene.initVM(vmargs=["-Djava.awt.headless=true"])
+    else:
+        env.attachCurrentThread()
+
+
+def _thread_analyzer():
+    analyzer = getattr(_local, "analyzer", None)
+    if analyzer is None:
+        _attach_jvm()
         analyzer = EnglishAnalyzer()
-        stream = analyzer.tokenStream("field", StringReader(text))
-        term_attr = stream.addAttribute(CharTermAttribute.class_)
+        _local.analyzer = analyzer
+    return analyzer
+
+
+def _lucene_tokens(analyzer, text: str) -> List[str]:
+    stream = analyzer.tokenStream("field", StringReader(text))
+    term_attr = stream.addAttribute(CharTermAttribute.class_)
+    tokens: List[str] = []
+    try:
         stream.reset()
-        tokens: List[str] = []
         while stream.incrementToken():
             tokens.append(term_attr.toString())
         stream.end()
+    finally:
+        # close() only releases the reader; the components stay cached for reuse
         stream.close()
-        analyzer.close()
-        return tokens
+    return tokens
+
+
+def tokenize(text: str, use_lucene: bool = True) -> List[str]:
+    if use_lucene and _HAS_LUCENE:
+        return _lucene_tokens(_thread_analyzer(), text)
     # Fallback simple regex tokenizer
-    return re.findall(r"[a-zA-Z0-9]+", text.lower())
+    return _TOKEN_RE.findall(text.lower())
+
+
+def tokenize_many(texts: Iterable[str], use_lucene: bool = True) -> Iterator[List[str]]:
+    # Batch variant of tokenize(): all texts go through this thread's analyzer
+    if use_lucene and _HAS_LUCENE:
+        analyzer = _thread_analyzer()
+        for text in texts:
+            yield _lucene_tokens(analyzer, text)
+        return
+    for text in texts:
+        yield _TOKEN_RE.findall(text.lower())
 
 
 def remove_stopwords(tokens: Iterable[str], stopwords: Iterable[str] = None) -> List[str]:
@@ -50,38 +97,114 @@ def remove_stopwords(tokens: Iterable[str], stopwords: Iterable[str] = None) ->
     return [t for t in tokens if t not in sw]
 
 
-def stem_porter(tokens: Iterable[str]) -> List[str]:
+def _stem_token(t: str) -> str:
     # Minimal Porter-like suffix stripping (no external deps); educational, not production-ready
-    result: List[str] = []
-    for t in tokens:
-        original = t
-        for suf in ("ing", "edly", "edly", "ed", "ly", "ies", "es", "s"):
-            if t.endswith(suf) and len(t) > len(suf) + 1:
-                t = t[: -len(suf)]
-                break
-        if t == "":
-            t = original
-        result.append(t)
-    return result
+    original = t
+    for suf in _STEM_SUFFIXES:
+        if t.endswith(suf) and len(t) > len(suf) + 1:
+            t = t[: -len(suf)]
+            break
+    if t == "":
+        t = original
+    return t
 
 
-def lemmatize_rule_based(tokens: Iterable[str]) -> List[str]:
+def _lemmatize_token(t: str) -> str:
     # Simple, tiny lemmatizer rules for demo
-    lemmas: List[str] = []
-    irregular = {"mice": "mouse", "men": "man", "children": "child", "geese": "goose"}
-    for t in tokens:
-        if t in irregular:
-            lemmas.append(irregular[t])
-            continue
-        if t.endswith("ies") and len(t) > 3:
-            lemmas.append(t[:-3] + "y")
-        elif t.endswith("ves"):
-            lemmas.append(t[:-3] + "f")
-        elif t.endswith("s") and not t.endswith("ss") and len(t) > 3:
-            lemmas.append(t[:-1])
+    if t in _IRREGULAR_LEMMAS:
+        return _IRREGULAR_LEMMAS[t]
+    if t.endswith("ies") and len(t) > 3:
+        return t[:-3] + "y"
+    if t.endswith("ves"):
+        return t[:-3] + "f"
+    if t.endswith("s") and not t.endswith("ss") and len(t) > 3:
+        return t[:-1]
+    return t
+
+
+def stem_porter(tokens: Iterable[str]) -> List[str]:
+    return [_stem_token(t) for t in tokens]
+
+
+def lemmatize_rule_based(tokens: Iterable[str]) -> List[str]:
+    return [_lemmatize_token(t) for t in tokens]
+
+
+class TextPipeline:
+    """
+    Compiled form of process_text(): tokenize, stopword filter, stem and lemmatize
+    in a single generator pass. The stem/lemma result is memoized per surface token
+    in a bounded LRU, which is hit for most tokens given Zipfian term frequencies.
+    """
+
+    def __init__(
+        self,
+        use_lucene: bool = True,
+        remove_sw: bool = True,
+        stemming: bool = False,
+        lemmatization: bool = True,
+        stopwords: Iterable[str] = None,
+        cache_size: int = 65536,
+    ):
+        self.use_lucene = use_lucene
+        self.stopwords = frozenset(stopwords) if stopwords is not None else _DEFAULT_STOPWORDS
+        self.remove_sw = remove_sw
+        self.stemming = stemming
+        self.lemmatization = lemmatization
+        if stemming or lemmatization:
+            self._transform = lru_cache(maxsize=cache_size)(self._transform_token)
         else:
-            lemmas.append(t)
-    return lemmas
+            self._transform = None
+
+    def _transform_token(self, t: str) -> str:
+        if self.stemming:
+            t = _stem_token(t)
+        if self.lemmatization:
+            t = _lemmatize_token(t)
+        return t
+
+    def _raw_tokens(self, text: str) -> Iterable[str]:
+        if self.use_lucene and _HAS_LUCENE:
+            return tokenize(text, use_lucene=True)
+        return (m.group() for m in _TOKEN_RE.finditer(text.lower()))
+
+    def _filter(self, tokens: Iterable[str]) -> Iterator[str]:
+        sw = self.stopwords if self.remove_sw else ()
+        transform = self._transform
+        for t in tokens:
+            if t in sw:
+                continue
+            yield transform(t) if transform is not None else t
+
+    def iter_tokens(self, text: str) -> Iterator[str]:
+        return self._filter(self._raw_tokens(text))
+
+    def __call__(self, text: str) -> List[str]:
+        return list(self.iter_tokens(text))
+
+    def process_many(self, texts: Iterable[str]) -> Iterator[List[str]]:
+        for tokens in tokenize_many(texts, use_lucene=self.use_lucene):
+            yield list(self._filter(tokens))
+
+    def cache_info(self):
+        return self._transform.cache_info() if self._transform is not None else None
+
+
+# Shared pipeline per flag combination, so the token cache survives across calls
+_PIPELINES: Dict[Tuple[bool, bool, bool, bool], TextPipeline] = {}
+
+
+def get_pipeline(
+    use_lucene: bool = True,
+    remove_sw: bool = True,
+    stemming: bool = False,
+    lemmatization: bool = True,
+) -> TextPipeline:
+    key = (use_lucene, remove_sw, stemming, lemmatization)
+    pipeline = _PIPELINES.get(key)
+    if pipeline is None:
+        pipeline = _PIPELINES.setdefault(key, TextPipeline(*key))
+    return pipeline
 
 
 def process_text(
@@ -91,13 +214,53 @@ def process_text(
     stemming: bool = False,
     lemmatization: bool = True,
 ):
-    tokens = tokenize(text, use_lucene=use_lucene)
-    if remove_sw:
-        tokens = remove_stopwords(tokens)
-    if stemming:
-        tokens = stem_porter(tokens)
-    if lemmatization:
-        tokens = lemmatize_rule_based(tokens)
-    return tokens
+    return get_pipeline(use_lucene, remove_sw, stemming, lemmatization)(text)
+
+
+def _process_batch(texts: List[str], flags: Tuple[bool, bool, bool, bool]) -> List[List[str]]:
+    # Runs inside a worker process; the worker keeps its own pipeline and token cache
+    return list(get_pipeline(*flags).process_many(texts))
+
 
+def _chunks(items: Iterable, size: int) -> Iterator[list]:
+    chunk = []
+    for item in items:
+        chunk.append(item)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
 
+
+def pool_context(use_lucene: bool = True):
+    # A JVM does not survive fork(), so Lucene workers start from a clean interpreter
+    return multiprocessing.get_context("spawn") if use_lucene and _HAS_LUCENE else None
+
+
+def process_many(
+    texts: Iterable[str],
+    use_lucene: bool = True,
+    remove_sw: bool = True,
+    stemming: bool = False,
+    lemmatization: bool = True,
+    workers: int = 1,
+    chunksize: int = 256,
+) -> Iterator[List[str]]:
+    """
+    process_text() over many texts, yielding token lists in input order.
+    With workers > 1 the texts are dispatched in chunks to a process pool; at most
+    2 * workers chunks are in flight, so memory stays bounded for long streams.
+    """
+    flags = (use_lucene, remove_sw, stemming, lemmatization)
+    if workers <= 1:
+        yield from get_pipeline(*flags).process_many(texts)
+        return
+    with ProcessPoolExecutor(max_workers=workers, mp_context=pool_context(use_lucene)) as pool:
+        pending = deque()
+        for chunk in _chunks(texts, chunksize):
+            pending.append(pool.submit(_process_batch, chunk, flags))
+            if len(pending) >= 2 * workers:
+                yield from pending.popleft().result()
+        while pending:
+            yield from pending.popleft().result()
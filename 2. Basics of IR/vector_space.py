@@ -0,0 +1,97 @@
+from typing import Iterable, List, Sequence, Tuple, Union
+
+import numpy as np  # type: ignore
+
+from matrix import CSRMatrix, count_matrix, idf_weights, row_ids, row_slice, tf_idf_matrix, tf_idf_weights, transposed
+from representation import AnalyzedCorpus, Corpus
+from text_processing import process_many
+
+# Batched cosine retrieval over the TF-IDF matrix.
+#
+# Documents are L2-normalized TF-IDF rows (tf_idf_matrix with norm="l2"). A batch
+# of queries is analyzed, vectorized with the same vocabulary, tf weighting and
+# idf, and L2-normalized, so cosine similarity is a plain dot product: one sparse
+# product Q @ D.T per block of queries gives a dense block of scores, and
+# np.argpartition picks each row's top k without sorting all documents.
+#
+# With SciPy the product is scipy's sparse matmul. Without it, every query term
+# gathers its column of D (a row of the transposed matrix) and np.bincount sums
+# the weighted entries into the score block, which touches the same nonzeros.
+
+
+def top_k(scores, k: int):
+    # Per row of a dense score block: the k best columns and their scores, best first
+    top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    top_scores = np.take_along_axis(scores, top, axis=1)
+    order = np.argsort(-top_scores, axis=1, kind="stable")
+    return np.take_along_axis(top, order, axis=1), np.take_along_axis(top_scores, order, axis=1)
+
+
+class VectorSpaceSearcher:
+    def __init__(
+        self,
+        corpus: Union[Corpus, AnalyzedCorpus],
+        use_lucene: bool = True,
+        workers: int = 1,
+        sublinear_tf: bool = False,
+        max_block_scores: int = 1 << 24,
+    ):
+        if not isinstance(corpus, AnalyzedCorpus):
+            corpus = AnalyzedCorpus(corpus, use_lucene=use_lucene, workers=workers)
+        self.use_lucene = use_lucene
+        self.workers = workers
+        self.sublinear_tf = sublinear_tf
+        self.max_block_scores = max_block_scores  # bounds the dense score block (queries x docs)
+        self.terms, self.doc_ids, self.doc_matrix = tf_idf_matrix(corpus, sublinear_tf=sublinear_tf, norm="l2")
+        self.vocabulary = {t: i for i, t in enumerate(self.terms)}
+        term_to_id = corpus.term_to_id
+        df = np.asarray([corpus.doc_freqs[term_to_id[t]] for t in self.terms], dtype=np.float64)
+        self.idf = idf_weights(df, len(self.doc_ids))
+        # Term-major copy of the documents: row t lists the docs containing term t
+        self._doc_matrix_t = transposed(self.doc_matrix)
+
+    def vectorize(self, queries: Iterable[str]):
+        """L2-normalized TF-IDF rows for `queries`, in the documents' term space."""
+        analyzed = AnalyzedCorpus([], use_lucene=self.use_lucene)
+        for i, tokens in enumerate(process_many(queries, use_lucene=self.use_lucene, workers=self.workers)):
+            analyzed.add(str(i), tokens)
+        counts = count_matrix(analyzed, self.vocabulary)
+        return tf_idf_weights(counts, analyzed.doc_lengths, self.idf, sublinear_tf=self.sublinear_tf, norm="l2")
+
+    def _scores(self, queries):
+        # Dense (queries x docs) cosine scores for one block of query rows
+        num_docs = len(self.doc_ids)
+        if not isinstance(queries, CSRMatrix):
+            return (queries @ self._doc_matrix_t).toarray()
+        docs_t = self._doc_matrix_t
+        starts = docs_t.indptr[queries.indices]
+        counts = docs_t.indptr[queries.indices + 1] - starts
+        # Offsets of every (query term, doc) entry in docs_t, gathered in one pass
+        first = np.cumsum(counts) - counts
+        entries = np.repeat(starts - first, counts) + np.arange(counts.sum())
+        keys = np.repeat(row_ids(queries), counts) * num_docs + docs_t.indices[entries]
+        weights = np.repeat(queries.data, counts) * docs_t.data[entries]
+        return np.bincount(keys, weights=weights, minlength=queries.shape[0] * num_docs).reshape(-1, num_docs)
+
+    def search_many(self, queries: Sequence[str], k: int = 10) -> List[List[Tuple[str, float]]]:
+        """Top-k (doc_id, cosine) per query, best first; documents sharing no term are left out."""
+        matrix = self.vectorize(queries)
+        num_docs = len(self.doc_ids)
+        k = min(k, num_docs)
+        results: List[List[Tuple[str, float]]] = []
+        if k <= 0:
+            return [[] for _ in range(matrix.shape[0])]
+        block = max(1, self.max_block_scores // max(num_docs, 1))
+        doc_ids = self.doc_ids
+        for start in range(0, matrix.shape[0], block):
+            stop = min(start + block, matrix.shape[0])
+            queries_block = row_slice(matrix, start, stop)
+            scores = self._scores(queries_block)
+            top, top_scores = top_k(scores, k)
+            for docs_row, scores_row in zip(top.tolist(), top_scores.tolist()):
+                results.append([(doc_ids[d], s) for d, s in zip(docs_row, scores_row) if s > 0.0])
+        return results
+
+    def search(self, query: str, k: int = 10) -> List[Tuple[str, float]]:
+        return self.search_many([query], k=k)[0]
+
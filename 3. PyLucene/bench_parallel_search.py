@@ -0,0 +1,116 @@
+import argparse
+import random
+import shutil
+import tempfile
+import time
+from typing import List
+
+from java.nio.file import Paths
+from org.apache.lucene.analysis.core import WhitespaceAnalyzer
+from org.apache.lucene.document import Document, Field, TextField
+from org.apache.lucene.index import DirectoryReader, IndexWriter, IndexWriterConfig, NoMergePolicy
+from org.apache.lucene.queryparser.classic import QueryParser
+from org.apache.lucene.store import FSDirectory
+
+from search_common import add_slice_arguments, ensure_jvm, new_searcher, shutdown
+
+# p50/p99 query latency versus --search-threads on a synthetic multi-segment index.
+#
+# The index has --segments segments of --docs-per-segment documents (one commit per
+# segment, merging disabled) drawn from a Zipf-like vocabulary. A query's slices run
+# in parallel, and Lucene's slice policy groups segments into slices of at most 250k
+# documents and 5 segments, so an index needs more than that for threads to help
+# unless --max-docs-per-slice / --max-segments-per-slice cut smaller slices. The
+# number of slices is printed with every row.
+
+
+def build_index(path: str, segments: int, docs_per_segment: int, doc_length: int, vocab_size: int, seed: int):
+    rng = random.Random(seed)
+    vocab = [f"w{i}" for i in range(vocab_size)]
+    cum_weights = []
+    total = 0.0
+    for rank in range(1, vocab_size + 1):
+        total += 1.0 / rank
+        cum_weights.append(total)
+
+    config = IndexWriterConfig(WhitespaceAnalyzer())
+    config.setMergePolicy(NoMergePolicy.INSTANCE)
+    config.setRAMBufferSizeMB(256.0)
+    writer = IndexWriter(FSDirectory.open(Paths.get(path)), config)
+    try:
+        for _ in range(segments):
+            for _ in range(docs_per_segment):
+                doc = Document()
+                doc.add(TextField("contents", " ".join(rng.choices(vocab, cum_weights=cum_weights, k=doc_length)), Field.Store.NO))
+                writer.addDocument(doc)
+            writer.commit()  # one segment per commit
+    finally:
+        writer.close()
+
+
+def make_queries(num: int, vocab_size: int, seed: int) -> List[str]:
+    # Two to four mid-frequency terms, OR-ed: enough matches to make scoring the cost
+    rng = random.Random(seed + 1)
+    lo, hi = 10, min(vocab_size, 2000)
+    return [" ".join(f"w{rng.randrange(lo, hi)}" for _ in range(rng.randint(2, 4))) for _ in range(num)]
+
+
+def percentile(sorted_values: List[float], q: float) -> float:
+    return sorted_values[min(len(sorted_values) - 1, int(q * len(sorted_values)))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Latency vs. search threads on a synthetic multi-segment index")
+    parser.add_argument("--index", default=None, help="Index directory (default: a temporary one, removed afterwards)")
+    parser.add_argument("--segments", type=int, default=40, help="Number of segments")
+    parser.add_argument("--docs-per-segment", type=int, default=25000, help="Documents per segment")
+    parser.add_argument("--doc-length", type=int, default=20, help="Tokens per document")
+    parser.add_argument("--vocab", type=int, default=50000, help="Vocabulary size")
+    parser.add_argument("--queries", type=int, default=500, help="Timed queries per setting")
+    parser.add_argument("--warmup", type=int, default=100, help="Untimed queries per setting")
+    parser.add_argument("--threads", type=int, nargs="+", default=[0, 1, 2, 4, 8], help="Search thread counts to compare")
+    parser.add_argument("--topk", type=int, default=10, help="Hits per query")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed")
+    add_slice_arguments(parser)
+    args = parser.parse_args()
+
+    ensure_jvm()
+
+    path = args.index or tempfile.mkdtemp(prefix="bench_parallel_")
+    try:
+        directory = FSDirectory.open(Paths.get(path))
+        if not DirectoryReader.indexExists(directory):
+            start = time.perf_counter()
+            build_index(path, args.segments, args.docs_per_segment, args.doc_length, args.vocab, args.seed)
+            print(f"indexed {args.segments} x {args.docs_per_segment} docs in {time.perf_counter() - start:.1f}s")
+
+        reader = DirectoryReader.open(directory)
+        qp = QueryParser("contents", WhitespaceAnalyzer())
+        queries = [qp.parse(q) for q in make_queries(args.warmup + args.queries, args.vocab, args.seed)]
+        print(f"{reader.leaves().size()} segments, {reader.maxDoc()} docs")
+        for threads in args.threads:
+            searcher, executor = new_searcher(reader, threads, args.max_docs_per_slice, args.max_segments_per_slice)
+            try:
+                for query in queries[: args.warmup]:
+                    searcher.search(query, args.topk)
+                latencies = []
+                for query in queries[args.warmup :]:
+                    start = time.perf_counter()
+                    searcher.search(query, args.topk)
+                    latencies.append(1000 * (time.perf_counter() - start))
+            finally:
+                shutdown(executor)
+            latencies.sort()
+            slices = len(searcher.getSlices()) if executor is not None else 1
+            print(
+                f"threads={threads:2d}  slices={slices:3d}  "
+                f"p50={percentile(latencies, 0.50):7.2f} ms  p99={percentile(latencies, 0.99):7.2f} ms"
+            )
+        reader.close()
+    finally:
+        if args.index is None:
+            shutil.rmtree(path, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
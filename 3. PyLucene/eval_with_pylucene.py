@@ -22,6 +22,8 @@ from org.apache.lucene.search.similarities import (  # type: ignore
 from org.apache.lucene.store import FSDirectory  # type: ignore
 from java.nio.file import Paths  # type: ignore
 
+from search_common import hydrate
+
 
 def precision_at_k(rels: Sequence[int], k: int) -> float:
     k = min(k, len(rels))
@@ -126,11 +128,9 @@ def evaluate_queries(
             hits = searcher.search(query, topk).scoreDocs
 
             # Get retrieved documents
-            stored_fields = reader.storedFields()
             retrieved_docs = []
-            for sd in hits:
-                doc = stored_fields.document(sd.doc)
-                doc_id = doc.get("path") or doc.get("id") or str(sd.doc)
+            for sd, doc in zip(hits, hydrate(reader, hits, ("path", "id"))):
+                doc_id = doc["path"] or doc["id"] or str(sd.doc)
                 retrieved_docs.append((doc_id, sd.score))
 
             # Build relevance list based on retrieved documents
@@ -6,28 +6,27 @@ try:
     import lucene
     from java.nio.file import Paths
     from org.apache.lucene.analysis.standard import StandardAnalyzer
-    from org.apache.lucene.document import Document, Field, StringField, TextField, StoredField
+    from org.apache.lucene.document import (
+        BinaryDocValuesField,
+        Document,
+        Field,
+        SortedDocValuesField,
+        StoredField,
+        StringField,
+        TextField,
+    )
     from org.apache.lucene.index import IndexWriter, IndexWriterConfig
     from org.apache.lucene.store import FSDirectory
+    from org.apache.lucene.util import BytesRef
     from org.apache.lucene.codecs.compressing import CompressionMode
     from org.apache.lucene.index import TieredMergePolicy
+
+    from search_common import ensure_jvm
 except Exception:
     print("PyLucene is required. See 3. PyLucene/README.md.")
     raise
 
 
-def ensure_jvm():
-    try:
-        env = lucene.getVMEnv()
-        if env is None:
-            lucene.initVM(vmargs=["-Djava.awt.headless=true"])  # start JVM once
-    except Exception:
-        try:
-            lucene.initVM(vmargs=["-Djava.awt.headless=true"])  # best effort
-        except ValueError:
-            pass
-
-
 def iter_text_files(sources):
     for src in sources:
         p = Path(src)
@@ -85,6 +84,10 @@ def add_doc(writer: IndexWriter, path: Path, text: str):
     doc = Document()
     doc.add(StringField("path", str(path), Field.Store.YES))
     doc.add(StoredField("filename", path.name))
+    # Doc values copies let searches read path/filename per hit without
+    # decompressing a stored-fields block (see hydrate() in search_common.py)
+    doc.add(SortedDocValuesField("path", BytesRef(str(path))))
+    doc.add(BinaryDocValuesField("filename", BytesRef(path.name)))
     if text:
         doc.add(TextField("contents", text, Field.Store.NO))
     else:
@@ -5,47 +5,58 @@ from java.nio.file import Paths
 from org.apache.lucene.analysis.standard import StandardAnalyzer
 from org.apache.lucene.index import DirectoryReader
 from org.apache.lucene.queryparser.classic import QueryParser
-from org.apache.lucene.search import IndexSearcher
 from org.apache.lucene.store import FSDirectory
 
-
-def ensure_jvm():
-    try:
-        env = lucene.getVMEnv()
-        if env is None:
-            lucene.initVM(vmargs=["-Djava.awt.headless=true"])
-    except Exception:
-        try:
-            lucene.initVM(vmargs=["-Djava.awt.headless=true"])
-        except ValueError:
-            pass
+from search_common import (
+    add_batch_arguments,
+    add_searcher_arguments,
+    check_batch_arguments,
+    ensure_jvm,
+    hydrate,
+    new_searcher,
+    run_batch,
+    search_page,
+    shutdown,
+)
 
 
 def main():
     parser = argparse.ArgumentParser(description="Boolean retrieval with PyLucene")
     parser.add_argument("--index", required=True, help="Index directory path")
-    parser.add_argument("--query", required=True, help="Boolean query string")
+    add_batch_arguments(parser, "Boolean query string", "boolean")
     parser.add_argument("--field", default="contents", help="Field to search")
     parser.add_argument("--topk", type=int, default=10, help="Number of results to show")
+    add_searcher_arguments(parser)
     args = parser.parse_args()
+    check_batch_arguments(parser, args)
 
     ensure_jvm()
 
     directory = FSDirectory.open(Paths.get(args.index))
     reader = DirectoryReader.open(directory)
-    searcher = IndexSearcher(reader)
-    analyzer = StandardAnalyzer()
+    searcher, executor = new_searcher(
+        reader, args.search_threads, args.max_docs_per_slice, args.max_segments_per_slice
+    )
+    try:
+        analyzer = StandardAnalyzer()
 
-    qp = QueryParser(args.field, analyzer)
-    query = qp.parse(args.query)
+        qp = QueryParser(args.field, analyzer)
+        if args.queries_file:
+            run_batch(reader, searcher, qp, args, escape=False)  # topics use the boolean syntax
+            return
 
-    hits = searcher.search(query, args.topk).scoreDocs
-    stored_fields = reader.storedFields()
-    for rank, sd in enumerate(hits, start=1):
-        doc = stored_fields.document(sd.doc)
-        print(f"{rank}. score={sd.score:.4f} path={doc.get('path')} filename={doc.get('filename')}")
+        query = qp.parse(args.query)
 
-    reader.close()
+        hits, first_rank, next_cursor = search_page(
+            searcher, query, args.topk, args.after, key=(args.field, args.query, "boolean")
+        )
+        for rank, (sd, doc) in enumerate(zip(hits, hydrate(reader, hits)), start=first_rank):
+            print(f"{rank}. score={sd.score:.4f} path={doc['path']} filename={doc['filename']}")
+        if next_cursor:
+            print(f"next page: --after {next_cursor}")
+    finally:
+        shutdown(executor)
+        reader.close()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,417 @@
+import base64
+import binascii
+import json
+import os
+import re
+import struct
+import sys
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import lucene
+from java.util.concurrent import Executors
+from org.apache.lucene.index import DirectoryReader, ReaderUtil
+from org.apache.lucene.queryparser.classic import QueryParser
+from java.util import ArrayList
+from org.apache.lucene.search import CollectionTerminatedException, IndexSearcher, ScoreDoc, TopScoreDocCollectorManager
+from org.apache.lucene.search.similarities import (
+    AxiomaticF1EXP,
+    AxiomaticF1LOG,
+    AxiomaticF2EXP,
+    AxiomaticF2LOG,
+    BM25Similarity,
+    ClassicSimilarity,
+    LMDirichletSimilarity,
+    LMJelinekMercerSimilarity,
+)
+
+# Helpers shared by the search entry points: the search_*.py scripts (including
+# their --queries-file batch mode) and search_server.py, which keep one JVM alive
+# and serve many queries from Python threads.
+
+SIMILARITIES = ("bm25", "classic", "dirichlet", "jm", "axiomatic")
+
+_AXIOMATIC = {
+    "F2EXP": AxiomaticF2EXP,
+    "F2LOG": AxiomaticF2LOG,
+    "F1EXP": AxiomaticF1EXP,
+    "F1LOG": AxiomaticF1LOG,
+}
+
+
+def ensure_jvm():
+    try:
+        env = lucene.getVMEnv()
+        if env is None:
+            lucene.initVM(vmargs=["-Djava.awt.headless=true"])
+    except Exception:
+        try:
+            lucene.initVM(vmargs=["-Djava.awt.headless=true"])
+        except ValueError:
+            pass
+
+
+def attach_current_thread():
+    # Every Python thread other than the one that started the JVM must be attached
+    # before it touches a Lucene object; attaching once per pool thread is enough.
+    lucene.getVMEnv().attachCurrentThread()
+
+
+def build_similarity(
+    name: str = "bm25",
+    k1: float = 1.2,
+    b: float = 0.75,
+    mu: float = 2000.0,
+    lam: float = 0.2,
+    variant: str = "F2EXP",
+    s: float = 0.35,
+):
+    n = name.lower()
+    if n == "bm25":
+        return BM25Similarity(float(k1), float(b))
+    if n in ("classic", "tfidf", "vsm"):
+        return ClassicSimilarity()
+    if n in ("dirichlet", "lm-dirichlet"):
+        return LMDirichletSimilarity(float(mu))
+    if n in ("jm", "jelinek-mercer"):
+        return LMJelinekMercerSimilarity(float(lam))
+    if n == "axiomatic":
+        cls = _AXIOMATIC.get(variant.upper())
+        if cls is None:
+            raise ValueError("Unknown axiomatic variant. Use one of: F2EXP, F2LOG, F1EXP, F1LOG")
+        return cls(float(s))
+    raise ValueError(f"Unknown similarity: {name}. Use one of: {', '.join(SIMILARITIES)}")
+
+
+# Lucene's default slice policy: at most this many documents and segments per slice
+MAX_DOCS_PER_SLICE = 250000
+MAX_SEGMENTS_PER_SLICE = 5
+TOTAL_HITS_THRESHOLD = 1000  # what IndexSearcher.search(query, n) counts exactly
+
+
+class SlicedSearcher:
+    """
+    IndexSearcher with its own slice limits. Lucene only lets a Java subclass change
+    IndexSearcher.slices(), so the slices come from the public static
+    IndexSearcher.slices(leaves, max_docs, max_segments) instead, and each query does
+    what IndexSearcher does with an executor: one Weight, one collector per slice
+    run on `pool` (JVM-attached Python threads; the scoring loop runs in Java without
+    the GIL), and the collectors reduced into one TopDocs. Everything else is
+    delegated to the wrapped IndexSearcher.
+    """
+
+    def __init__(self, reader, pool: ThreadPoolExecutor, max_docs_per_slice: int, max_segments_per_slice: int):
+        self.searcher = IndexSearcher(reader)
+        self.pool = pool
+        self.slices = IndexSearcher.slices(reader.leaves(), max_docs_per_slice, max_segments_per_slice)
+
+    def __getattr__(self, name):
+        return getattr(self.searcher, name)
+
+    def getSlices(self):
+        return self.slices
+
+    def search(self, query, n: int):
+        return self.searchAfter(None, query, n)
+
+    def searchAfter(self, after, query, n: int):
+        if not self.slices:
+            return self.searcher.searchAfter(after, query, n)  # empty index
+        manager = TopScoreDocCollectorManager(n, after, TOTAL_HITS_THRESHOLD)
+        collectors = [manager.newCollector() for _ in self.slices]
+        weight = self.searcher.createWeight(self.searcher.rewrite(query), collectors[0].scoreMode(), 1.0)
+        futures = [self.pool.submit(self._search_slice, s, weight, c) for s, c in zip(self.slices, collectors)]
+        reduced = ArrayList()
+        for future, collector in zip(futures, collectors):
+            future.result()
+            reduced.add(collector)
+        return manager.reduce(reduced)
+
+    @staticmethod
+    def _search_slice(leaf_slice, weight, collector):
+        for ctx in leaf_slice.leaves:
+            try:
+                leaf_collector = collector.getLeafCollector(ctx)
+                scorer = weight.bulkScorer(ctx)
+                if scorer is not None:
+                    scorer.score(leaf_collector, ctx.reader().getLiveDocs())
+            except lucene.JavaError as e:
+                # The collector needs nothing more from this segment
+                if not CollectionTerminatedException.instance_(e.getJavaException()):
+                    raise
+
+
+def new_searcher(reader, threads: int = 0, max_docs_per_slice: int = 0, max_segments_per_slice: int = 0):
+    """
+    (searcher, executor) over `reader`. With threads > 0 the slices of one query
+    (groups of segments) are searched in parallel; otherwise executor is None.
+    Without slice limits the searcher is an IndexSearcher on a Java fixed thread
+    pool using Lucene's slice policy; with max_docs_per_slice or
+    max_segments_per_slice (the other one keeping Lucene's default) it is a
+    SlicedSearcher. Shut the executor down when done: Java pool threads would keep
+    the JVM alive.
+    """
+    executor = new_executor(threads, max_docs_per_slice, max_segments_per_slice)
+    return searcher_for(reader, executor, max_docs_per_slice, max_segments_per_slice), executor
+
+
+def new_executor(threads: int, max_docs_per_slice: int = 0, max_segments_per_slice: int = 0):
+    if threads <= 0:
+        return None
+    if max_docs_per_slice > 0 or max_segments_per_slice > 0:
+        return ThreadPoolExecutor(max_workers=threads, initializer=attach_current_thread)
+    return Executors.newFixedThreadPool(threads)
+
+
+def searcher_for(reader, executor, max_docs_per_slice: int = 0, max_segments_per_slice: int = 0):
+    # A searcher over `reader` sharing `executor`, which came from new_executor() with the same limits
+    if executor is None:
+        return IndexSearcher(reader)
+    if max_docs_per_slice > 0 or max_segments_per_slice > 0:
+        return SlicedSearcher(
+            reader,
+            executor,
+            max_docs_per_slice if max_docs_per_slice > 0 else MAX_DOCS_PER_SLICE,
+            max_segments_per_slice if max_segments_per_slice > 0 else MAX_SEGMENTS_PER_SLICE,
+        )
+    return IndexSearcher(reader, executor)
+
+
+def shutdown(executor):
+    # Both a Java ExecutorService and a Python ThreadPoolExecutor
+    if executor is not None:
+        executor.shutdown()
+
+
+def _doc_values_getter(leaf_reader, field: str):
+    # Per-segment reader of `field` from its SORTED or BINARY doc values, or None
+    # when the field has to be read from stored fields
+    info = leaf_reader.getFieldInfos().fieldInfo(field)
+    if info is None:
+        return lambda doc: None  # no document of the segment has the field at all
+    kind = str(info.getDocValuesType())
+    if kind == "SORTED":
+        dv = leaf_reader.getSortedDocValues(field)
+        return lambda doc: dv.lookupOrd(dv.ordValue()).utf8ToString() if dv.advanceExact(doc) else None
+    if kind == "BINARY":
+        dv = leaf_reader.getBinaryDocValues(field)
+        return lambda doc: dv.binaryValue().utf8ToString() if dv.advanceExact(doc) else None
+    return None
+
+
+def hydrate(reader, score_docs, fields: Sequence[str] = ("path", "filename")) -> List[Dict[str, Optional[str]]]:
+    """
+    Values of `fields` for every hit, in hit order. Hits are visited segment by
+    segment in doc ID order, the only order doc-values iterators allow, and read
+    from doc values (indexer.py writes path/filename as SORTED/BINARY). Only
+    fields without doc values, e.g. in indexes built before, fall back to
+    loading the hit's stored fields; fields a segment lacks entirely are None.
+    """
+    values: List[Dict[str, Optional[str]]] = [{} for _ in score_docs]
+    leaves = reader.leaves()
+    leaf = None
+    leaf_end = 0
+    getters: list = []
+    stored_fields = None
+    for i in sorted(range(len(score_docs)), key=lambda i: score_docs[i].doc):
+        doc = score_docs[i].doc
+        if leaf is None or doc >= leaf_end:
+            leaf = leaves.get(ReaderUtil.subIndex(doc, leaves))
+            leaf_end = leaf.docBase + leaf.reader().maxDoc()
+            getters = [_doc_values_getter(leaf.reader(), f) for f in fields]
+        stored = None
+        for field, get in zip(fields, getters):
+            if get is not None:
+                values[i][field] = get(doc - leaf.docBase)
+                continue
+            if stored is None:
+                if stored_fields is None:
+                    stored_fields = reader.storedFields()
+                stored = stored_fields.document(doc)
+            values[i][field] = stored.get(field)
+    return values
+
+
+# Deep paging: a page ends with an opaque cursor holding the last hit's (score, doc),
+# the version of the index it came from, the number of hits returned so far and a
+# hash of the query and similarity settings. The next page is
+# IndexSearcher.searchAfter() from that hit, which collects only one page of hits
+# however deep it is. Doc IDs are only meaningful in the index version they came
+# from, and scores only for the query that produced them, so a cursor from another
+# version or another query is rejected.
+
+_CURSOR = struct.Struct(">fiqqI")  # score, doc, index version, hits returned so far, query hash
+
+
+def query_hash(key: Sequence) -> int:
+    # Short hash of what a page's scores depend on: field, query text, similarity and its parameters
+    return zlib.crc32(repr(tuple(key)).encode("utf-8"))
+
+
+def encode_cursor(last, generation: int, offset: int, key_hash: int = 0) -> str:
+    raw = _CURSOR.pack(last.score, last.doc, generation, offset, key_hash)
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple["ScoreDoc", int, int, int]:
+    """(last hit, index version, hits returned so far, query hash) of a cursor."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        score, doc, generation, offset, key_hash = _CURSOR.unpack(raw)
+    except (binascii.Error, struct.error, ValueError):
+        raise ValueError(f"Malformed cursor: {cursor!r}")
+    return ScoreDoc(doc, score), generation, offset, key_hash
+
+
+def index_generation(searcher) -> int:
+    return DirectoryReader.cast_(searcher.getIndexReader()).getVersion()
+
+
+def search_page(searcher, query, topk: int, after: Optional[str] = None, key: Sequence = ()):
+    """
+    One page of hits: (hits, rank of the first hit, cursor of the next page). The
+    next cursor is None once a page comes back short. `key` names the query and
+    scoring (field, query text, similarity and its parameters); a cursor is only
+    accepted for the same key.
+    """
+    generation = index_generation(searcher)
+    key_hash = query_hash(key)
+    if after:
+        last, cursor_generation, offset, cursor_hash = decode_cursor(after)
+        if cursor_generation != generation:
+            raise ValueError("The cursor belongs to another version of the index; search again without it")
+        if cursor_hash != key_hash:
+            raise ValueError("The cursor belongs to another query or similarity; search again without it")
+        hits = searcher.searchAfter(last, query, topk).scoreDocs
+    else:
+        offset = 0
+        hits = searcher.search(query, topk).scoreDocs
+    next_cursor = None
+    if len(hits) == topk:
+        next_cursor = encode_cursor(hits[-1], generation, offset + len(hits), key_hash)
+    return hits, offset + 1, next_cursor
+
+
+def add_searcher_arguments(parser):
+    parser.add_argument(
+        "--search-threads", type=int, default=0, help="Search the segments of each query in parallel on N threads (0: sequential)"
+    )
+    add_slice_arguments(parser)
+
+
+def add_slice_arguments(parser):
+    parser.add_argument(
+        "--max-docs-per-slice",
+        type=int,
+        default=0,
+        help=f"Documents per parallel slice (0: Lucene's {MAX_DOCS_PER_SLICE})",
+    )
+    parser.add_argument(
+        "--max-segments-per-slice",
+        type=int,
+        default=0,
+        help=f"Segments per parallel slice (0: Lucene's {MAX_SEGMENTS_PER_SLICE})",
+    )
+
+
+# Batch mode: a queries file is read and parsed once, the parsed queries are run
+# concurrently against one shared IndexSearcher (which is thread-safe for
+# searching), and the TREC run is written in topic order as results come in.
+
+_TREC_TOPIC = re.compile(r"<top>(.*?)</top>", re.S | re.I)
+# <num> and <title> may be closed (</title>) or, as in the classic TREC files, not
+_TREC_NUM = re.compile(r"<num>\s*(?:Number:)?\s*([^\s<]+)", re.I)
+_TREC_TITLE = re.compile(r"<title>\s*(?:Topic:)?(.*?)(?=</?[a-z]+>|$)", re.S | re.I)
+
+
+def _parse_trec_topics(text: str) -> List[Tuple[str, str]]:
+    queries = []
+    for topic in _TREC_TOPIC.findall(text):
+        num = _TREC_NUM.search(topic)
+        title = _TREC_TITLE.search(topic)
+        if num and title:
+            queries.append((num.group(1), " ".join(title.group(1).split())))
+    return queries
+
+
+def read_queries(path: str, fmt: Optional[str] = None) -> List[Tuple[str, str]]:
+    """
+    (qid, query text) pairs from TREC topics (<top><num><title>), TSV (qid<TAB>text)
+    or JSONL ({"id"|"qid": ..., "query"|"text"|"title": ...}). The format defaults to
+    the file extension: .tsv, .jsonl/.json, anything else is read as TREC topics.
+    """
+    if fmt is None:
+        ext = os.path.splitext(path)[1].lower()
+        fmt = {".tsv": "tsv", ".jsonl": "jsonl", ".json": "jsonl"}.get(ext, "trec")
+    with open(path, encoding="utf-8") as f:
+        if fmt == "trec":
+            return _parse_trec_topics(f.read())
+        queries = []
+        for line_no, line in enumerate(f, start=1):
+            line = line.strip()
+            if not line:
+                continue
+            if fmt == "tsv":
+                qid, sep, text = line.partition("\t")
+                if not sep:
+                    raise ValueError(f"{path}:{line_no}: expected qid<TAB>query")
+            elif fmt == "jsonl":
+                obj = json.loads(line)
+                qid = obj.get("id", obj.get("qid"))
+                text = obj.get("query") or obj.get("text") or obj.get("title")
+                if qid is None or not text:
+                    raise ValueError(f"{path}:{line_no}: expected an id/qid and a query/text/title")
+            else:
+                raise ValueError(f"Unknown queries format: {fmt}. Use trec, tsv or jsonl.")
+            queries.append((str(qid), text))
+        return queries
+
+
+def add_batch_arguments(parser, query_help: str, tag: str):
+    # --query for one query, or --queries-file for a TREC run over many
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--query", help=query_help)
+    parser.add_argument("--after", help="Cursor printed with the previous page: show the next --topk hits")
+    source.add_argument("--queries-file", help="Batch mode: TREC topics, TSV (qid<TAB>query) or JSONL queries")
+    parser.add_argument("--queries-format", choices=("trec", "tsv", "jsonl"), help="Queries file format (default: by extension)")
+    parser.add_argument("--run-file", default="run.txt", help="TREC run file written in batch mode")
+    parser.add_argument("--run-tag", default=tag, help="Run tag (last column of the run file)")
+    parser.add_argument("--threads", type=int, default=os.cpu_count() or 1, help="Query threads in batch mode")
+
+
+def check_batch_arguments(parser, args):
+    if args.after and args.queries_file:
+        parser.error("--after pages through a single --query; it cannot be used with --queries-file")
+
+
+def run_batch(reader, searcher, query_parser, args, doc_id_field: str = "path", escape: bool = True) -> int:
+    """
+    Runs args.queries_file against `searcher` and writes args.run_file; returns the
+    number of queries run. With `escape`, query texts are free text: characters
+    the query parser treats as syntax (?, :, quotes, ...) are escaped first.
+    """
+    parsed = []
+    skipped = 0
+    for qid, text in read_queries(args.queries_file, args.queries_format):
+        try:
+            parsed.append((qid, query_parser.parse(QueryParser.escape(text) if escape else text)))
+        except lucene.JavaError as e:
+            skipped += 1
+            print(f"Skipping query {qid}: {e.getJavaException()}", file=sys.stderr)
+
+    def search(item):
+        qid, query = item
+        hits = searcher.search(query, args.topk).scoreDocs
+        lines = []
+        for rank, (sd, values) in enumerate(zip(hits, hydrate(reader, hits, (doc_id_field,))), start=1):
+            doc_id = values[doc_id_field] or str(sd.doc)
+            lines.append(f"{qid} Q0 {doc_id} {rank} {sd.score:.6f} {args.run_tag}\n")
+        return lines
+
+    with ThreadPoolExecutor(max_workers=max(1, args.threads), initializer=attach_current_thread) as pool:
+        with open(args.run_file, "w", encoding="utf-8") as out:
+            for lines in pool.map(search, parsed):
+                out.writelines(lines)
+    print(f"Wrote {len(parsed)} queries to {args.run_file} ({skipped} skipped)")
+    return len(parsed)
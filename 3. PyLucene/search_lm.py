@@ -1,12 +1,12 @@
 #!/usr/bin/env python3
 import argparse
 import sys
+from typing import Optional
 
 from lucene import initVM  # type: ignore
 from org.apache.lucene.analysis.standard import StandardAnalyzer  # type: ignore
 from org.apache.lucene.index import DirectoryReader  # type: ignore
 from org.apache.lucene.queryparser.classic import QueryParser  # type: ignore
-from org.apache.lucene.search import IndexSearcher  # type: ignore
 from org.apache.lucene.search.similarities import (  # type: ignore
     LMDirichletSimilarity,
     LMJelinekMercerSimilarity,
@@ -14,6 +14,17 @@ from org.apache.lucene.search.similarities import (  # type: ignore
 from org.apache.lucene.store import FSDirectory  # type: ignore
 from java.nio.file import Paths  # type: ignore
 
+from search_common import (
+    add_batch_arguments,
+    add_searcher_arguments,
+    check_batch_arguments,
+    hydrate,
+    new_searcher,
+    run_batch,
+    search_page,
+    shutdown,
+)
+
 
 def build_similarity(variant: str, mu: float, lam: float):
     v = variant.lower()
@@ -24,50 +35,90 @@ def build_similarity(variant: str, mu: float, lam: float):
     raise ValueError(f"Unknown LM variant: {variant}. Use 'dirichlet' or 'jm'.")
 
 
-def run_search(index_path: str, query_text: str, field: str, topk: int, variant: str, mu: float, lam: float):
+def run_search(
+    index_path: str,
+    query_text: str,
+    field: str,
+    topk: int,
+    variant: str,
+    mu: float,
+    lam: float,
+    search_threads: int = 0,
+    after: Optional[str] = None,
+    max_docs_per_slice: int = 0,
+    max_segments_per_slice: int = 0,
+):
     initVM()
 
     directory = FSDirectory.open(Paths.get(index_path))
     reader = DirectoryReader.open(directory)
-    searcher = IndexSearcher(reader)
-
-    similarity = build_similarity(variant, mu, lam)
-    searcher.setSimilarity(similarity)
-
-    analyzer = StandardAnalyzer()
-    parser = QueryParser(field, analyzer)
-    query = parser.parse(query_text)
-
-    hits = searcher.search(query, topk).scoreDocs
-
-    print(f"Variant: {variant} | field: {field} | topk: {topk}")
-    if variant.lower().startswith("dir"):
-        print(f"Dirichlet mu = {mu}")
-    else:
-        print(f"JM lambda = {lam}")
-    print("== Results ==")
+    searcher, executor = new_searcher(reader, search_threads, max_docs_per_slice, max_segments_per_slice)
+    try:
+        similarity = build_similarity(variant, mu, lam)
+        searcher.setSimilarity(similarity)
+
+        analyzer = StandardAnalyzer()
+        parser = QueryParser(field, analyzer)
+        query = parser.parse(query_text)
+
+        hits, first_rank, next_cursor = search_page(
+            searcher, query, topk, after, key=(field, query_text, variant.lower(), mu, lam)
+        )
+
+        print(f"Variant: {variant} | field: {field} | topk: {topk}")
+        if variant.lower().startswith("dir"):
+            print(f"Dirichlet mu = {mu}")
+        else:
+            print(f"JM lambda = {lam}")
+        print("== Results ==")
+
+        for rank, (sd, doc) in enumerate(zip(hits, hydrate(reader, hits, ("path", "id"))), start=first_rank):
+            doc_id = doc["path"] or doc["id"] or str(sd.doc)
+            print(f"{rank:2d}. score={sd.score:.4f}\t{doc_id}")
+        if next_cursor:
+            print(f"next page: --after {next_cursor}")
+    finally:
+        shutdown(executor)
+        reader.close()
+        directory.close()
+
+
+def run_queries_file(args):
+    initVM()
 
-    stored_fields = reader.storedFields()
-    for rank, sd in enumerate(hits, start=1):
-        doc = stored_fields.document(sd.doc)
-        doc_id = doc.get("path") or doc.get("id") or str(sd.doc)
-        print(f"{rank:2d}. score={sd.score:.4f}\t{doc_id}")
+    directory = FSDirectory.open(Paths.get(args.index))
+    reader = DirectoryReader.open(directory)
+    searcher, executor = new_searcher(
+        reader, args.search_threads, args.max_docs_per_slice, args.max_segments_per_slice
+    )
+    try:
+        searcher.setSimilarity(build_similarity(args.variant, args.mu, args.lam))
+        parser = QueryParser(args.field, StandardAnalyzer())
 
-    reader.close()
-    directory.close()
+        run_batch(reader, searcher, parser, args)
+    finally:
+        shutdown(executor)
+        reader.close()
+        directory.close()
 
 
 def main(argv=None):
     parser = argparse.ArgumentParser(description="PyLucene LM retrieval (Dirichlet/JM)")
     parser.add_argument("--index", required=True, help="Path to index directory")
-    parser.add_argument("--query", required=True, help="Query string")
+    add_batch_arguments(parser, "Query string", "lm")
     parser.add_argument("--field", default="contents", help="Field to search (default: contents)")
     parser.add_argument("--topk", type=int, default=10, help="Number of results to show")
+    add_searcher_arguments(parser)
     parser.add_argument("--variant", default="dirichlet", help="LM variant: dirichlet | jm")
     parser.add_argument("--mu", type=float, default=2000.0, help="Dirichlet mu (if variant=dirichlet)")
     parser.add_argument("--lambda", dest="lam", type=float, default=0.2, help="JM lambda in [0,1] (if variant=jm)")
 
     args = parser.parse_args(argv)
+    check_batch_arguments(parser, args)
+
+    if args.queries_file:
+        run_queries_file(args)
+        return
 
     run_search(
         index_path=args.index,
@@ -77,6 +128,10 @@ def main(argv=None):
         variant=args.variant,
         mu=args.mu,
         lam=args.lam,
+        search_threads=args.search_threads,
+        after=args.after,
+        max_docs_per_slice=args.max_docs_per_slice,
+        max_segments_per_slice=args.max_segments_per_slice,
     )
 
 
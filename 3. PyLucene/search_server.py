@@ -0,0 +1,320 @@
+import argparse
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from urllib.parse import parse_qsl, urlparse
+
+import lucene
+from java.nio.file import Paths
+from org.apache.lucene.analysis.standard import StandardAnalyzer
+from org.apache.lucene.queryparser.classic import QueryParser
+from org.apache.lucene.search import SearcherLifetimeManager, SearcherManager
+from org.apache.lucene.store import FSDirectory
+
+from search_common import (
+    add_searcher_arguments,
+    attach_current_thread,
+    build_similarity,
+    decode_cursor,
+    ensure_jvm,
+    hydrate,
+    new_executor,
+    search_page,
+    searcher_for,
+    shutdown,
+)
+
+# Long-lived HTTP/JSON search server: the JVM, the index readers and the analyzer
+# are set up once, so a query costs milliseconds instead of a JVM start.
+#
+# Each index gets one SearcherManager. A request acquires the current searcher,
+# wraps its reader in a fresh IndexSearcher carrying the requested similarity (the
+# shared searcher is never mutated, so concurrent requests can score differently),
+# and releases it when done. A background thread calls maybeRefresh() so commits
+# from a running indexer become visible without a restart.
+#
+# A response carries next_cursor while more hits may follow; passing it back as
+# "after" returns the next page via searchAfter. Every searcher that served a page is
+# recorded in a SearcherLifetimeManager under its index version, so the next page
+# is read from the same point-in-time view even after a refresh, until it has been
+# superseded for --cursor-ttl seconds. Expired searchers are pruned by requests
+# (at most every PRUNE_SECONDS) as well as by refreshes, so their readers are
+# released even when automatic refresh is disabled.
+#
+# Requests are served by a fixed pool of threads; each one is attached to the JVM
+# once, when the pool starts it. With --search-threads, all searchers also share
+# one pool that searches the segment slices of each query in parallel (slice sizes
+# set by --max-docs-per-slice / --max-segments-per-slice, see search_common).
+
+
+PRUNE_SECONDS = 1.0  # least time between request-driven prunes of expired searchers
+
+
+class IndexHandle:
+    def __init__(self, name: str, path: str):
+        self.name = name
+        self.path = path
+        self.directory = FSDirectory.open(Paths.get(path))
+        self.manager = SearcherManager(self.directory, None)
+        self.lifetime = SearcherLifetimeManager()  # searchers that cursors may still point into
+        self.last_prune = time.monotonic()
+
+    def prune(self, max_age: float):
+        self.last_prune = time.monotonic()
+        self.lifetime.prune(SearcherLifetimeManager.PruneByAge(max_age))
+
+    def close(self):
+        self.lifetime.close()
+        self.manager.close()
+        self.directory.close()
+
+
+class CursorExpired(Exception):
+    pass
+
+
+class SearchService:
+    def __init__(
+        self,
+        indexes,
+        field: str = "contents",
+        max_topk: int = 1000,
+        search_threads: int = 0,
+        cursor_ttl: float = 600.0,
+        max_docs_per_slice: int = 0,
+        max_segments_per_slice: int = 0,
+    ):
+        self.indexes = {name: IndexHandle(name, path) for name, path in indexes}
+        self.default_index = indexes[0][0]
+        self.field = field
+        self.max_topk = max_topk
+        self.analyzer = StandardAnalyzer()  # thread-safe; QueryParser is not, so one per request
+        self.slice_limits = (max_docs_per_slice, max_segments_per_slice)
+        self.executor = new_executor(search_threads, *self.slice_limits)
+        self.cursor_ttl = cursor_ttl
+
+    def refresh(self):
+        for handle in self.indexes.values():
+            handle.manager.maybeRefresh()
+            handle.prune(self.cursor_ttl)
+
+    def search(self, params: dict) -> dict:
+        text = params.get("query") or params.get("q")
+        if not text:
+            raise ValueError("Missing 'query'")
+        name = params.get("index", self.default_index)
+        if name not in self.indexes:
+            raise KeyError(name)
+        field = params.get("field", self.field)
+        topk = int(params.get("topk", 10))
+        if not 0 < topk <= self.max_topk:
+            raise ValueError(f"topk must be in [1, {self.max_topk}]")
+        sim_name = params.get("similarity", "bm25")
+        sim_params = {
+            "k1": float(params.get("k1", 1.2)),
+            "b": float(params.get("b", 0.75)),
+            "mu": float(params.get("mu", 2000.0)),
+            "lam": float(params.get("lambda", 0.2)),
+            "variant": str(params.get("variant", "F2EXP")).upper(),
+        }
+        similarity = build_similarity(sim_name, **sim_params)
+        query = QueryParser(field, self.analyzer).parse(text)
+        after = params.get("after")
+        key = (field, text, sim_name.lower(), *sorted(sim_params.items()))
+
+        handle = self.indexes[name]
+        if time.monotonic() - handle.last_prune >= PRUNE_SECONDS:
+            handle.prune(self.cursor_ttl)
+        start = time.perf_counter()
+        if after:
+            _last, generation, _offset, _hash = decode_cursor(after)
+            shared = handle.lifetime.acquire(generation)
+            if shared is None:
+                raise CursorExpired("The cursor's index version is no longer kept; search again without it")
+            release = handle.lifetime.release
+        else:
+            shared = handle.manager.acquire()
+            release = handle.manager.release
+        try:
+            if not after:
+                handle.lifetime.record(shared)  # keeps this version for the next page's cursor
+            reader = shared.getIndexReader()
+            searcher = searcher_for(reader, self.executor, *self.slice_limits)
+            searcher.setSimilarity(similarity)
+            hits, first_rank, next_cursor = search_page(searcher, query, topk, after, key)
+            results = [
+                {"rank": rank, "score": sd.score, "doc": sd.doc, "path": doc["path"], "filename": doc["filename"]}
+                for rank, (sd, doc) in enumerate(zip(hits, hydrate(reader, hits)), start=first_rank)
+            ]
+        finally:
+            release(shared)
+        return {
+            "index": name,
+            "query": text,
+            "similarity": sim_name,
+            "took_ms": round(1000 * (time.perf_counter() - start), 3),
+            "hits": results,
+            "next_cursor": next_cursor,
+        }
+
+    def close(self):
+        shutdown(self.executor)
+        for handle in self.indexes.values():
+            handle.close()
+
+
+class PooledHTTPServer(HTTPServer):
+    # Like ThreadingHTTPServer, but connections are handled by a bounded pool of
+    # JVM-attached threads instead of one new thread each
+    quiet = False
+
+    def __init__(self, address, handler, service: SearchService, workers: int):
+        super().__init__(address, handler)
+        self.service = service
+        self.pool = ThreadPoolExecutor(max_workers=workers, initializer=attach_current_thread)
+
+    def process_request(self, request, client_address):
+        self.pool.submit(self._process, request, client_address)
+
+    def _process(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+
+    def server_close(self):
+        super().server_close()
+        self.pool.shutdown(wait=True)
+
+
+class SearchHandler(BaseHTTPRequestHandler):
+    server: PooledHTTPServer
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        if url.path == "/health":
+            self._reply(200, {"status": "ok", "indexes": sorted(self.server.service.indexes)})
+        elif url.path == "/search":
+            self._search(dict(parse_qsl(url.query)))
+        else:
+            self._reply(404, {"error": f"Unknown path: {url.path}"})
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        if url.path == "/refresh":
+            self.server.service.refresh()
+            self._reply(200, {"status": "ok"})
+            return
+        if url.path != "/search":
+            self._reply(404, {"error": f"Unknown path: {url.path}"})
+            return
+        length = int(self.headers.get("Content-Length", 0))
+        try:
+            params = json.loads(self.rfile.read(length) or b"{}")
+        except ValueError:
+            self._reply(400, {"error": "Request body must be a JSON object"})
+            return
+        if not isinstance(params, dict):
+            self._reply(400, {"error": "Request body must be a JSON object"})
+            return
+        self._search(params)
+
+    def _search(self, params: dict):
+        try:
+            self._reply(200, self.server.service.search(params))
+        except KeyError as e:
+            self._reply(404, {"error": f"Unknown index: {e.args[0]}"})
+        except CursorExpired as e:
+            self._reply(410, {"error": str(e)})
+        except (ValueError, TypeError) as e:
+            # Malformed parameters, e.g. a JSON list where a number was expected
+            self._reply(400, {"error": str(e)})
+        except lucene.JavaError as e:
+            # Typically a ParseException from the query parser
+            self._reply(400, {"error": str(e.getJavaException())})
+
+    def _reply(self, status: int, body: dict):
+        payload = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        if not self.server.quiet:
+            super().log_message(format, *args)
+
+
+def parse_index_arg(value: str):
+    # "name=path" or just "path" (named after its directory)
+    if "=" in value:
+        name, path = value.split("=", 1)
+    else:
+        path = value
+        name = os.path.basename(os.path.normpath(path))
+    return name, path
+
+
+def refresh_loop(service: SearchService, interval: float, stop: threading.Event):
+    attach_current_thread()
+    while not stop.wait(interval):
+        service.refresh()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Long-lived PyLucene search server (HTTP/JSON)")
+    parser.add_argument("--index", nargs="+", required=True, help="Index directories, as path or name=path")
+    parser.add_argument("--field", default="contents", help="Default field to search")
+    parser.add_argument("--host", default="127.0.0.1", help="Address to bind (0.0.0.0 inside Docker)")
+    parser.add_argument("--port", type=int, default=8080, help="Port to listen on")
+    parser.add_argument("--threads", type=int, default=8, help="Request handler threads")
+    add_searcher_arguments(parser)
+    parser.add_argument("--max-topk", type=int, default=1000, help="Largest topk a request may ask for")
+    parser.add_argument("--refresh-seconds", type=float, default=5.0, help="Reopen interval for new commits (0 disables)")
+    parser.add_argument(
+        "--cursor-ttl", type=float, default=600.0, help="Seconds a replaced index version stays available to cursors"
+    )
+    parser.add_argument("--quiet", action="store_true", help="Do not log requests")
+    args = parser.parse_args()
+
+    ensure_jvm()
+
+    indexes = [parse_index_arg(v) for v in args.index]
+    if len({name for name, _ in indexes}) != len(indexes):
+        parser.error("Index names must be unique; use name=path")
+    service = SearchService(
+        indexes,
+        field=args.field,
+        max_topk=args.max_topk,
+        search_threads=args.search_threads,
+        cursor_ttl=args.cursor_ttl,
+        max_docs_per_slice=args.max_docs_per_slice,
+        max_segments_per_slice=args.max_segments_per_slice,
+    )
+    server = PooledHTTPServer((args.host, args.port), SearchHandler, service, args.threads)
+    server.quiet = args.quiet
+
+    stop = threading.Event()
+    if args.refresh_seconds > 0:
+        threading.Thread(target=refresh_loop, args=(service, args.refresh_seconds, stop), daemon=True).start()
+
+    names = ", ".join(f"{name}={path}" for name, path in indexes)
+    print(f"Serving {names} on http://{args.host}:{args.port} with {args.threads} threads")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        stop.set()
+        server.server_close()
+        service.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -6,9 +6,18 @@ try:
     import lucene
     from java.nio.file import Paths
     from org.apache.lucene.analysis.standard import StandardAnalyzer
-    from org.apache.lucene.document import Document, Field, StringField, StoredField, FieldType
+    from org.apache.lucene.document import (
+        BinaryDocValuesField,
+        Document,
+        Field,
+        FieldType,
+        SortedDocValuesField,
+        StoredField,
+        StringField,
+    )
     from org.apache.lucene.index import IndexWriter, IndexWriterConfig
     from org.apache.lucene.store import FSDirectory
+    from org.apache.lucene.util import BytesRef
     from org.apache.lucene.index import TieredMergePolicy
     from org.apache.lucene.index import IndexOptions
 except Exception:
@@ -73,6 +82,10 @@ def add_doc(writer: IndexWriter, path: Path, text: str, ft: FieldType):
     doc = Document()
     doc.add(StringField("path", str(path), Field.Store.YES))
     doc.add(StoredField("filename", path.name))
+    # Doc values copies let searches read path/filename per hit without
+    # decompressing a stored-fields block (see hydrate() in 3. PyLucene/search_common.py)
+    doc.add(SortedDocValuesField("path", BytesRef(str(path))))
+    doc.add(BinaryDocValuesField("filename", BytesRef(path.name)))
     doc.add(Field("contents", text, ft))
     writer.addDocument(doc)
 